@@ -0,0 +1,374 @@
+"""conjunctions.py
+
+Conjunction screening: find close approaches between many objects on
+conic orbits without comparing every pair.
+
+Screening runs in three stages:
+    1. shell filter - pairs whose [periapsis, apoapsis] shells do not come
+       within the screening distance can never meet, and objects whose
+       shell meets no other are dropped before any positions are hashed;
+    2. spatial index - at each time step, a uniform grid hashes positions
+       so only objects in neighbouring cells are compared, and pairs whose
+       straight-line relative motion cannot close the gap are dropped.
+       Objects are grouped into speed classes so that the grid padding
+       for approaches between samples grows with the faster object of
+       each pair, not with the fastest object overall;
+    3. refinement - each candidate is refined to the exact time and
+       distance of closest approach.
+
+"""
+
+import numpy as np
+
+from toolkit.conics import conic_radius, conic_periapsis, conic_apoapsis
+from toolkit.kepler import mean_anomaly_from_true, mean_motion
+from toolkit.kepler import true_anomaly_from_mean
+from toolkit import cartesian_from_polar2d
+
+GOLDEN = 0.5 * (np.sqrt(5) - 1)
+
+# half-stencil of neighbouring cells: each pair of cells is visited once
+_NEIGHBOUR_CELLS = ((0, 1), (1, -1), (1, 0), (1, 1))
+
+# full stencil, for looking up the neighbours of selected points only
+_STENCIL_CELLS = tuple((_dx, _dy) for _dx in (-1, 0, 1) for _dy in (-1, 0, 1))
+
+# ratio of the largest to smallest periapsis speed within a speed class
+SPEED_CLASS_RATIO = 2.
+
+
+def conic_shells(e, l):
+    """Periapsis and apoapsis radii; unbound orbits have infinite apoapsis."""
+    e, l = np.broadcast_arrays(np.asarray(e, dtype=float), l)
+    with np.errstate(divide='ignore'):
+        _apoapsis = conic_apoapsis(e, l)
+    return conic_periapsis(e, l), np.where(e < 1, _apoapsis, np.inf)
+
+
+def shells_overlap(periapsis, apoapsis, i, j, distance):
+    """Whether the radial shells of objects i and j come within distance."""
+    return (
+        (periapsis[i] <= apoapsis[j] + distance)
+        & (periapsis[j] <= apoapsis[i] + distance)
+    )
+
+
+def count_shell_pairs(periapsis, apoapsis, distance):
+    """Number of object pairs whose shells come within distance of each other.
+
+    Objects are swept in order of periapsis, so the count costs
+    O(N log N) rather than O(N**2).
+    """
+    _order = np.argsort(periapsis)
+    _rp, _ra = periapsis[_order], apoapsis[_order]
+    _end = np.searchsorted(_rp, _ra + distance, side='right')
+    return np.maximum(_end - np.arange(len(_rp)) - 1, 0).sum()
+
+
+def shell_partners(periapsis, apoapsis, distance):
+    """Number of other objects whose shells come within distance of each.
+
+    A shell j misses shell i if it lies wholly outside or wholly inside
+    it; both cases are counted by binary search.
+    """
+    _outside = len(periapsis) - np.searchsorted(
+        np.sort(periapsis), apoapsis + distance, side='right'
+    )
+    _inside = np.searchsorted(
+        np.sort(apoapsis), periapsis - distance, side='left'
+    )
+    return len(periapsis) - _outside - _inside - 1
+
+
+def _expand_ranges(index, start, stop):
+    """All pairs (index[k], m) with start[k] <= m < stop[k]."""
+    _num = np.maximum(stop - start, 0)
+    _total = _num.sum()
+    _offset = np.arange(_total) - np.repeat(np.cumsum(_num) - _num, _num)
+    return np.repeat(index, _num), np.repeat(start, _num) + _offset
+
+
+def grid_pairs(x, y, distance, query=None):
+    """Pairs of points (i < j) closer than distance, using a uniform grid.
+
+    With a boolean query mask, only pairs including a query point are
+    found, by looking up the neighbours of the query points alone.
+    """
+    x, y = np.asarray(x), np.asarray(y)
+    if len(x) < 2:
+        return np.empty(0, dtype=int), np.empty(0, dtype=int)
+    if query is not None and np.all(query):
+        query = None
+
+    # integer cell coordinates, offset so neighbour keys cannot wrap
+    _cx = np.floor(x / distance).astype(np.int64)
+    _cy = np.floor(y / distance).astype(np.int64)
+    _cx, _cy = _cx - _cx.min() + 1, _cy - _cy.min() + 1
+    _width = _cy.max() + 2
+    _keys = _cx * _width + _cy
+
+    # sort points by cell
+    _order = np.argsort(_keys, kind='stable')
+    _sorted = _keys[_order]
+    _cells, _start, _count = np.unique(
+        _sorted, return_index=True, return_counts=True
+    )
+    _position = np.arange(len(_sorted))
+    _i, _j = [], []
+
+    if query is None:
+        # pairs within the same cell
+        _cell = np.searchsorted(_cells, _sorted)
+        _pi, _pj = _expand_ranges(
+            _position, _position + 1, _start[_cell] + _count[_cell]
+        )
+        _i.append(_pi)
+        _j.append(_pj)
+        _stencil = _NEIGHBOUR_CELLS
+    else:
+        # every neighbour of each query point
+        _position = _position[query[_order]]
+        _sorted = _sorted[_position]
+        _stencil = _STENCIL_CELLS
+
+    # pairs with neighbouring cells
+    for _dx, _dy in _stencil:
+        _neighbour = _sorted + _dx * _width + _dy
+        _k = np.minimum(np.searchsorted(_cells, _neighbour), len(_cells) - 1)
+        _found = _cells[_k] == _neighbour
+        _pi, _pj = _expand_ranges(
+            _position[_found], _start[_k][_found],
+            _start[_k][_found] + _count[_k][_found],
+        )
+        _i.append(_pi)
+        _j.append(_pj)
+
+    # map back to input order and apply exact distance test
+    _i, _j = _order[np.concatenate(_i)], _order[np.concatenate(_j)]
+    _close = np.hypot(x[_i] - x[_j], y[_i] - y[_j]) < distance
+    if query is not None:
+        # drop self pairs, and count pairs of two query points once
+        _close &= (_i != _j) & ~(query[_j] & (_j < _i))
+    _i, _j = _i[_close], _j[_close]
+    return np.minimum(_i, _j), np.maximum(_i, _j)
+
+
+class ConicTracks:
+    """Objects on conic orbits, positioned by Kepler timing.
+
+    gm may be given per object. The true anomalies of elements are taken
+    at time epoch; objects with sense -1 move clockwise.
+    """
+    def __init__(self, elements, gm, epoch=0., sense=1):
+        """Initialiser."""
+        self.l = np.asarray(elements.semilatus_rectum, dtype=float)
+        self.e = np.asarray(elements.eccentricity, dtype=float)
+        self.periapsis_angle = np.asarray(elements.periapsis_angle)
+        self.gm = np.broadcast_to(np.asarray(gm, dtype=float), self.l.shape)
+        self.sense = np.broadcast_to(np.asarray(sense), self.l.shape)
+
+        # mean anomaly at t = 0 and mean motion
+        self.mean_motion = mean_motion(self.e, self.l, self.gm)
+        self.mean_anomaly0 = mean_anomaly_from_true(
+            self.sense * elements.true_anomaly, self.e
+        ) - self.mean_motion * epoch
+
+    def __len__(self):
+        return len(self.l)
+
+    def periapsis_speed(self):
+        """Fastest speed of each object, reached at periapsis."""
+        return np.sqrt(self.gm * (1 + self.e) ** 2 / self.l)
+
+    def max_speed(self):
+        """Fastest speed of any object."""
+        return self.periapsis_speed().max()
+
+    def max_acceleration(self):
+        """Largest gravitational acceleration of each object."""
+        return self.gm / conic_periapsis(self.e, self.l) ** 2
+
+    def true_anomaly(self, t, index=slice(None)):
+        """True anomaly of objects at time t."""
+        _M = self.mean_anomaly0[index] + self.mean_motion[index] * t
+        return self.sense[index] * true_anomaly_from_mean(_M, self.e[index])
+
+    def position(self, t, index=slice(None)):
+        """Cartesian position of objects at time t."""
+        _f = self.true_anomaly(t, index)
+        _r = conic_radius(_f, self.e[index], self.l[index])
+        return cartesian_from_polar2d(_r, _f + self.periapsis_angle[index])
+
+    def velocity(self, t, index=slice(None)):
+        """Cartesian velocity of objects at time t."""
+        _e, _l = self.e[index], self.l[index]
+        _f = self.true_anomaly(t, index)
+        _h = self.sense[index] * np.sqrt(self.gm[index] / _l)
+
+        # radial and transverse components
+        _vr, _vt = _h * _e * np.sin(_f), _h * (1 + _e * np.cos(_f))
+        _angle = _f + self.periapsis_angle[index]
+        _c, _s = np.cos(_angle), np.sin(_angle)
+        return _vr * _c - _vt * _s, _vr * _s + _vt * _c
+
+
+class ConjunctionReport:
+    """Close approaches found by screen_conjunctions."""
+    def __init__(self, first, second, time, distance, stages):
+        """Initialiser."""
+        self.first, self.second = first, second
+        self.time, self.distance = time, distance
+        self.stages = stages
+
+    def __repr__(self):
+        return f"ConjunctionReport({len(self)} conjunctions)"
+
+    def __len__(self):
+        return len(self.time)
+
+    def pruning_ratios(self):
+        """Fraction of pairs surviving each stage, relative to the previous."""
+        _names = list(self.stages)
+        return {
+            _name: self.stages[_name] / max(self.stages[_prev], 1)
+            for _prev, _name in zip(_names[:-1], _names[1:])
+        }
+
+
+def _linear_miss_distance(dx, dy, dvx, dvy, half_width):
+    """Closest approach of straight-line relative motion within half_width."""
+    _vsq = dvx * dvx + dvy * dvy
+    with np.errstate(invalid='ignore', divide='ignore'):
+        _s = np.where(_vsq > 0, -(dx * dvx + dy * dvy) / _vsq, 0.)
+    _s = np.clip(_s, -half_width, half_width)
+    return np.hypot(dx + dvx * _s, dy + dvy * _s)
+
+
+def _refine_closest_approach(tracks, i, j, t_lo, t_hi, num_iterations=40):
+    """Vectorised golden-section search for the minimum separation."""
+    def _separation(t):
+        _xi, _yi = tracks.position(t, i)
+        _xj, _yj = tracks.position(t, j)
+        return np.hypot(_xi - _xj, _yi - _yj)
+
+    _a, _b = t_lo, t_hi
+    _c = _b - GOLDEN * (_b - _a)
+    _d = _a + GOLDEN * (_b - _a)
+    _fc, _fd = _separation(_c), _separation(_d)
+    for _ in range(num_iterations):
+        # keep the sub-interval holding the smaller value, reusing one point
+        _left = _fc < _fd
+        _a, _b = np.where(_left, _a, _c), np.where(_left, _d, _b)
+        _new = np.where(_left, _b - GOLDEN * (_b - _a), _a + GOLDEN * (_b - _a))
+        _fnew = _separation(_new)
+        _c, _d = np.where(_left, _new, _d), np.where(_left, _c, _new)
+        _fc, _fd = np.where(_left, _fnew, _fd), np.where(_left, _fc, _fnew)
+
+    time = 0.5 * (_a + _b)
+    return time, _separation(time)
+
+
+def screen_conjunctions(elements, gm, times, distance):
+    """Find all approaches closer than distance over the given times.
+
+    elements is an OrbitalElements of arrays (one entry per object, with
+    the true anomaly at t = 0) and times a sorted array of sample times.
+    Returns a ConjunctionReport with the object indices, time and distance
+    of each conjunction, and the number of pairs surviving each stage.
+    """
+    tracks = ConicTracks(elements, gm)
+    times = np.asarray(times, dtype=float)
+    _num = len(tracks)
+
+    # stage 1: radial shell filter; objects whose shell meets no other
+    # shell are not positioned or hashed at all
+    _rp, _ra = conic_shells(tracks.e, tracks.l)
+    stages = {
+        'all': _num * (_num - 1) // 2,
+        'shell': count_shell_pairs(_rp, _ra, distance),
+    }
+    _screened = np.flatnonzero(shell_partners(_rp, _ra, distance) > 0)
+    _rp, _ra = _rp[_screened], _ra[_screened]
+
+    # speed classes: each pair is found in the class of its faster object,
+    # with the grid padded by that class's top speed so that approaches
+    # between samples are caught
+    _step = np.diff(times).max() if len(times) > 1 else 0.
+    _speed = tracks.periapsis_speed()[_screened]
+    _class = np.zeros(len(_screened), dtype=int)
+    if len(_screened):
+        _class = np.floor(
+            np.log(_speed / _speed.min()) / np.log(SPEED_CLASS_RATIO)
+        ).astype(int)
+    _classes = [
+        (
+            np.flatnonzero(_class <= _c),
+            _class[_class <= _c] == _c,
+            distance + _speed[_class == _c].max() * _step,
+        )
+        for _c in np.unique(_class)
+    ]
+
+    # bound on the relative acceleration, for the straight-line filter
+    _accel = tracks.max_acceleration()[_screened]
+
+    # stage 2: spatial index at each time step, then discard samples whose
+    # straight-line relative motion (plus curvature bound) cannot get close
+    _i, _j, _k = [], [], []
+    _num_grid = []
+    for _index, _t in enumerate(times):
+        _x, _y = tracks.position(_t, _screened)
+        _pi, _pj = [], []
+        for _members, _query, _padded in _classes:
+            _a, _b = grid_pairs(_x[_members], _y[_members], _padded, _query)
+            _pi.append(_members[_a])
+            _pj.append(_members[_b])
+        _pi, _pj = np.concatenate(_pi), np.concatenate(_pj)
+        _keep = shells_overlap(_rp, _ra, _pi, _pj, distance)
+        _pi, _pj = _pi[_keep], _pj[_keep]
+        _num_grid.append(_pi * _num + _pj)
+
+        _vx, _vy = tracks.velocity(_t, _screened)
+        _miss = _linear_miss_distance(
+            _x[_pj] - _x[_pi], _y[_pj] - _y[_pi],
+            _vx[_pj] - _vx[_pi], _vy[_pj] - _vy[_pi],
+            0.5 * _step,
+        )
+        _curvature = 0.125 * (_accel[_pi] + _accel[_pj]) * _step * _step
+        _keep = _miss - _curvature < distance
+        _i.append(_pi[_keep])
+        _j.append(_pj[_keep])
+        _k.append(np.full(_keep.sum(), _index))
+    _i, _j, _k = map(np.concatenate, (_i, _j, _k))
+    _i, _j = _screened[_i], _screened[_j]
+    stages['grid'] = len(np.unique(np.concatenate(_num_grid)))
+    stages['linear'] = len(np.unique(_i * _num + _j))
+
+    # split the runs of consecutive samples flagging the same pair into one
+    # encounter per sampled minimum of separation, so that a pair staying
+    # close over a long stretch keeps every approach within it
+    _order = np.lexsort((_k, _j, _i))
+    _i, _j, _k = _i[_order], _j[_order], _k[_order]
+    _first = np.ones(len(_i), dtype=bool)
+    _first[1:] = (
+        (_i[1:] != _i[:-1]) | (_j[1:] != _j[:-1]) | (_k[1:] != _k[:-1] + 1)
+    )
+    _last = np.roll(_first, -1)
+    _xi, _yi = tracks.position(times[_k], _i)
+    _xj, _yj = tracks.position(times[_k], _j)
+    _sep = np.hypot(_xi - _xj, _yi - _yj)
+    _prev = np.where(_first, np.inf, np.roll(_sep, 1))
+    _next = np.where(_last, np.inf, np.roll(_sep, -1))
+    _minimum = (_sep <= _prev) & (_sep < _next)
+    _i, _j, _k = _i[_minimum], _j[_minimum], _k[_minimum]
+
+    # stage 3: exact refinement between the samples either side of each
+    _lo = times[np.maximum(_k - 1, 0)]
+    _hi = times[np.minimum(_k + 1, len(times) - 1)]
+    _time, _dist = _refine_closest_approach(tracks, _i, _j, _lo, _hi)
+    _close = _dist < distance
+    stages['conjunction'] = len(np.unique(_i[_close] * _num + _j[_close]))
+
+    return ConjunctionReport(
+        _i[_close], _j[_close], _time[_close], _dist[_close], stages
+    )
@@ -0,0 +1,167 @@
+"""locus_loadgen.py
+
+Load generator for the locus service: opens many concurrent WebSocket
+clients, each dragging a slider at a fixed message rate, and reports
+throughput and the latency from each answered request to its payload.
+Requests are numbered and payloads echo the number, so requests that the
+service coalesced away are not counted.
+
+Run from the orbit-demo directory, with the service already running:
+    python locus_loadgen.py --clients 2000 --rate 30 --duration 10
+
+"""
+
+import argparse
+import asyncio
+import json
+import random
+from collections import deque
+from time import perf_counter
+
+import numpy as np
+
+from locus_protocol import encode_frame, read_message, read_http_head
+from locus_protocol import decode_loci, websocket_key, websocket_accept
+from locus_protocol import encode_close, OP_TEXT, OP_BINARY, OP_CLOSE
+from locus_protocol import CLOSE_NORMAL, MAX_SEQUENCE, HOST, PORT
+
+PERCENTILES = (50, 90, 99)
+
+
+class ClientStats:
+    """Counters and latencies collected across all clients."""
+    def __init__(self):
+        """Initialiser."""
+        self.connected = 0
+        self.failed = 0
+        self.sent = 0
+        self.received = 0
+        self.errors = 0
+        self.latencies = []
+
+
+async def open_websocket(host, port):
+    """Open a WebSocket connection to the service: (reader, writer)."""
+    reader, writer = await asyncio.open_connection(host, port)
+    _key = websocket_key()
+    writer.write((
+        f"GET /ws HTTP/1.1\r\nHost: {host}:{port}\r\n"
+        "Upgrade: websocket\r\nConnection: Upgrade\r\n"
+        f"Sec-WebSocket-Key: {_key}\r\nSec-WebSocket-Version: 13\r\n\r\n"
+    ).encode('latin-1'))
+    _status, _headers = await read_http_head(reader)
+    if (' 101 ' not in _status
+            or _headers.get('sec-websocket-accept') != websocket_accept(_key)):
+        raise ConnectionError(f"handshake failed: {_status}")
+    return reader, writer
+
+
+async def run_client(host, port, rate, duration, stats, seed):
+    """One client: drag the impulse slider at rate messages per second."""
+    _random = random.Random(seed)
+    try:
+        reader, writer = await open_websocket(host, port)
+    except (OSError, asyncio.IncompleteReadError):
+        stats.failed += 1
+        return
+    stats.connected += 1
+
+    # (seq, send time) of requests not yet answered or superseded
+    _pending = deque()
+
+    async def _receive():
+        while True:
+            _opcode, _payload = await read_message(reader, writer)
+            if _opcode == OP_CLOSE:
+                return
+            if _opcode == OP_TEXT:
+                stats.errors += 1
+            if _opcode == OP_BINARY:
+                _seq, *_ = decode_loci(_payload)
+                stats.received += 1
+                # earlier requests were coalesced by the service
+                while _pending and _pending[0][0] != _seq:
+                    _pending.popleft()
+                if _pending:
+                    stats.latencies.append(
+                        perf_counter() - _pending.popleft()[1]
+                    )
+
+    _receiver = asyncio.create_task(_receive())
+
+    # random walk of the impulse sliders
+    _params = {
+        'speed' : 1., 'impulse_speed' : 0., 'impulse_angle' : 0., 'seq' : 0,
+    }
+    _end = perf_counter() + duration
+    await asyncio.sleep(_random.uniform(0, 1. / rate))
+    try:
+        while perf_counter() < _end:
+            _params['impulse_speed'] = min(max(
+                _params['impulse_speed'] + _random.uniform(-0.05, 0.05), 0
+            ), 1)
+            _params['impulse_angle'] = round(
+                _params['impulse_angle'] + _random.uniform(-10, 10)
+            )
+            _params['seq'] = (_params['seq'] + 1) & MAX_SEQUENCE
+            writer.write(encode_frame(
+                OP_TEXT, json.dumps(_params).encode(), masked=True
+            ))
+            _pending.append((_params['seq'], perf_counter()))
+            stats.sent += 1
+            await writer.drain()
+            await asyncio.sleep(1. / rate)
+
+        writer.write(encode_close(CLOSE_NORMAL, masked=True))
+        await asyncio.wait_for(_receiver, timeout=5)
+    except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+        pass
+    finally:
+        _receiver.cancel()
+        writer.close()
+
+
+async def run_load(host, port, clients, rate, duration):
+    """Run all clients concurrently and return their ClientStats."""
+    stats = ClientStats()
+    await asyncio.gather(*(
+        run_client(host, port, rate, duration, stats, _seed)
+        for _seed in range(clients)
+    ))
+    return stats
+
+
+def report(stats, duration):
+    """Summary of a load run."""
+    _lines = [
+        f"clients: {stats.connected} connected, {stats.failed} failed",
+        f"messages: {stats.sent} sent ({stats.sent / duration:.0f}/s), "
+        f"{stats.received} payloads received "
+        f"({stats.received / duration:.0f}/s), {stats.errors} errors",
+    ]
+    if stats.latencies:
+        _ms = 1e3 * np.percentile(stats.latencies, PERCENTILES)
+        _lines.append("latency: " + ", ".join(
+            f"p{_p} {_v:.1f} ms" for _p, _v in zip(PERCENTILES, _ms)
+        ))
+    return '\n'.join(_lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='locus service load test')
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--clients', type=int, default=1000)
+    parser.add_argument('--rate', type=float, default=30.,
+                        help='messages per second per client')
+    parser.add_argument('--duration', type=float, default=10.)
+    args = parser.parse_args()
+
+    _start = perf_counter()
+    stats = asyncio.run(run_load(
+        args.host, args.port, args.clients, args.rate, args.duration
+    ))
+    print(report(stats, perf_counter() - _start))
+
+if __name__ == "__main__":
+    main()
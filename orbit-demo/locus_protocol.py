@@ -0,0 +1,238 @@
+"""locus_protocol.py
+
+Wire format shared by the locus service and its clients: the binary locus
+payload, and a minimal asyncio WebSocket (RFC 6455) framing layer built on
+the standard library.
+
+A locus payload is little-endian:
+    header  '<4sIII' magic b'ORBT', sequence number echoed from the
+            request, old locus length, new locus length
+    scalars 13 float32:
+            rmax,
+            old orbit (l, e, periapsis angle),
+            new orbit (l, e, periapsis angle),
+            position (x, y), velocity (vx, vy), impulse (dx, dy)
+    loci    float32 (x, y) pairs of the old locus, then of the new locus
+
+Requests carry the slider state as a JSON object (WebSocket) or query
+fields (HTTP) of finite numbers, with an optional integer 'seq' echoed in
+the payload header so that clients can match payloads to requests.
+
+"""
+
+import base64
+import hashlib
+import json
+import math
+import os
+import struct
+
+import numpy as np
+
+HOST, PORT = '127.0.0.1', 8765
+
+MAGIC = b'ORBT'
+HEADER = struct.Struct('<4sIII')
+SEQUENCE = struct.Struct('<I')
+NUM_SCALARS = 13
+MAX_SEQUENCE = (1 << 32) - 1
+
+# slider state carried by each request, with defaults
+PARAMETERS = {
+    'speed' : 1.,
+    'angle' : 0.,
+    'impulse_speed' : 0.,
+    'impulse_angle' : 0.,
+    'num_segment' : 300,
+    'seq' : 0,
+}
+
+# largest WebSocket message accepted, in either direction; a locus payload
+# at the service's maximum resolution is under 48 KiB
+MAX_MESSAGE_SIZE = 1 << 16
+MAX_CONTROL_SIZE = 125
+
+WEBSOCKET_GUID = b'258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+# opcodes
+OP_CONTINUATION, OP_TEXT, OP_BINARY = 0x0, 0x1, 0x2
+OP_CLOSE, OP_PING, OP_PONG = 0x8, 0x9, 0xA
+
+# close status codes
+CLOSE_NORMAL, CLOSE_TOO_BIG = 1000, 1009
+
+
+class MessageTooBig(ValueError):
+    """A WebSocket frame or message longer than the accepted maximum."""
+
+
+def encode_loci(scalars, old_locus, new_locus, seq=0):
+    """Pack scalars and two (x, y) loci into a binary payload."""
+    _old = np.column_stack(old_locus).astype('<f4')
+    _new = np.column_stack(new_locus).astype('<f4')
+    return b''.join([
+        HEADER.pack(MAGIC, seq, len(_old), len(_new)),
+        np.asarray(scalars, dtype='<f4').tobytes(),
+        _old.tobytes(),
+        _new.tobytes(),
+    ])
+
+def stamp_sequence(payload, seq):
+    """Copy of a binary payload answering the request numbered seq."""
+    _start = len(MAGIC)
+    _end = _start + SEQUENCE.size
+    return b''.join([payload[:_start], SEQUENCE.pack(seq), payload[_end:]])
+
+def decode_loci(payload):
+    """Unpack a binary payload: (seq, scalars, old locus, new locus)."""
+    _magic, seq, _num_old, _num_new = HEADER.unpack_from(payload)
+    if _magic != MAGIC:
+        raise ValueError("not a locus payload")
+    _data = np.frombuffer(payload, dtype='<f4', offset=HEADER.size)
+    scalars = _data[:NUM_SCALARS]
+    _points = _data[NUM_SCALARS:].reshape(-1, 2)
+    return (
+        seq, scalars,
+        _points[:_num_old], _points[_num_old:_num_old + _num_new],
+    )
+
+def parse_parameters(fields):
+    """Slider state from a mapping of (string or numeric) fields.
+
+    Raises ValueError unless fields is a dict of known parameters with
+    finite numeric values within the sliders' domain (speed > 0,
+    |angle| < 90 degrees, impulse_speed >= 0), and seq an integer in
+    [0, MAX_SEQUENCE].
+    """
+    if not isinstance(fields, dict):
+        raise ValueError("parameters must be an object")
+    _params = dict(PARAMETERS)
+    for _name, _value in fields.items():
+        if _name not in _params:
+            raise ValueError(f"unknown parameter {_name!r}")
+        try:
+            _number = float(_value)
+        except (TypeError, ValueError, OverflowError):
+            raise ValueError(f"{_name} must be a number") from None
+        if not math.isfinite(_number):
+            raise ValueError(f"{_name} must be finite")
+        _params[_name] = type(PARAMETERS[_name])(_number)
+
+    # the domain of the sliders: a moving, non-radial initial orbit
+    if not _params['speed'] > 0:
+        raise ValueError("speed must be positive")
+    if not abs(_params['angle']) < 90:
+        raise ValueError("angle must be in (-90, 90) degrees")
+    if not _params['impulse_speed'] >= 0:
+        raise ValueError("impulse_speed must not be negative")
+    if not 0 <= _params['seq'] <= MAX_SEQUENCE:
+        raise ValueError(f"seq must be in [0, {MAX_SEQUENCE}]")
+    return _params
+
+def parse_message(message):
+    """Slider state from a WebSocket text message (a JSON object)."""
+    try:
+        _fields = json.loads(message)
+    except RecursionError:
+        raise ValueError("message nested too deeply") from None
+    return parse_parameters(_fields)
+
+
+def websocket_accept(key):
+    """Sec-WebSocket-Accept value for a Sec-WebSocket-Key."""
+    _digest = hashlib.sha1(key.encode() + WEBSOCKET_GUID).digest()
+    return base64.b64encode(_digest).decode()
+
+def websocket_key():
+    """Random Sec-WebSocket-Key for a client handshake."""
+    return base64.b64encode(os.urandom(16)).decode()
+
+def _mask(payload, mask):
+    """XOR payload with the repeating 4-byte mask."""
+    _num = len(payload)
+    _key = (mask * (_num // 4 + 1))[:_num]
+    _masked = int.from_bytes(payload, 'big') ^ int.from_bytes(_key, 'big')
+    return _masked.to_bytes(_num, 'big')
+
+def encode_frame(opcode, payload, masked=False):
+    """A single final WebSocket frame; clients must mask their frames."""
+    _num = len(payload)
+    _header = bytearray([0x80 | opcode])
+    _bit = 0x80 if masked else 0
+    if _num < 126:
+        _header.append(_bit | _num)
+    elif _num < 1 << 16:
+        _header.append(_bit | 126)
+        _header += struct.pack('>H', _num)
+    else:
+        _header.append(_bit | 127)
+        _header += struct.pack('>Q', _num)
+
+    if masked:
+        _key = os.urandom(4)
+        return bytes(_header) + _key + _mask(payload, _key)
+    return bytes(_header) + payload
+
+def encode_close(code, reason='', masked=False):
+    """A close frame with a status code and (truncated) reason."""
+    _payload = struct.pack('>H', code) + reason.encode()
+    return encode_frame(OP_CLOSE, _payload[:MAX_CONTROL_SIZE], masked)
+
+async def read_frame(reader, max_size=MAX_MESSAGE_SIZE):
+    """Read one WebSocket frame: (fin, opcode, payload).
+
+    Raises MessageTooBig, before reading the payload, if it is longer than
+    max_size bytes (or a control frame longer than MAX_CONTROL_SIZE).
+    """
+    _first, _second = await reader.readexactly(2)
+    fin, opcode = bool(_first & 0x80), _first & 0x0F
+
+    _num = _second & 0x7F
+    if _num == 126:
+        _num, = struct.unpack('>H', await reader.readexactly(2))
+    elif _num == 127:
+        _num, = struct.unpack('>Q', await reader.readexactly(8))
+    if _num > (MAX_CONTROL_SIZE if opcode & 0x8 else max_size):
+        raise MessageTooBig(f"{_num} byte frame exceeds the maximum size")
+
+    _key = await reader.readexactly(4) if _second & 0x80 else None
+    payload = await reader.readexactly(_num)
+    if _key is not None:
+        payload = _mask(payload, _key)
+    return fin, opcode, payload
+
+async def read_message(reader, writer, max_size=MAX_MESSAGE_SIZE):
+    """Read one complete data message: (opcode, payload).
+
+    Control frames are handled in passing: pings are answered, and a
+    close frame (or end of stream) returns (OP_CLOSE, payload). Raises
+    MessageTooBig if the message grows beyond max_size bytes.
+    """
+    _opcode, _parts, _size = None, [], 0
+    while True:
+        fin, opcode, payload = await read_frame(reader, max_size - _size)
+        if opcode == OP_CLOSE:
+            return OP_CLOSE, payload
+        if opcode == OP_PING:
+            writer.write(encode_frame(OP_PONG, payload))
+            continue
+        if opcode == OP_PONG:
+            continue
+
+        if opcode != OP_CONTINUATION:
+            _opcode = opcode
+        _parts.append(payload)
+        _size += len(payload)
+        if fin:
+            return _opcode, b''.join(_parts)
+
+async def read_http_head(reader):
+    """Read an HTTP request or response head: (start line, headers)."""
+    _head = await reader.readuntil(b'\r\n\r\n')
+    _lines = _head.decode('latin-1').split('\r\n')
+    headers = {}
+    for _line in _lines[1:]:
+        if ':' in _line:
+            _name, _value = _line.split(':', 1)
+            headers[_name.strip().lower()] = _value.strip()
+    return _lines[0], headers
@@ -0,0 +1,405 @@
+"""locus_service.py
+
+Optional asyncio HTTP/WebSocket service computing orbits for browser and
+notebook clients, without a matplotlib GUI. Uses only the standard library
+and numpy.
+
+Endpoints:
+    GET /locus?speed=1&angle=0&impulse_speed=0.3&impulse_angle=0
+        one binary locus payload (see locus_protocol); 400 Bad Request
+        for unknown, non-finite or out-of-range parameters, and for
+        states with no finite orbit
+    GET /stats
+        JSON counters for connections, requests and the locus cache
+    GET /ws
+        WebSocket: send slider states as JSON text messages, receive
+        binary locus payloads. Only the latest message received while a
+        payload is being computed or sent is parsed and answered; an
+        invalid one is answered with a text message giving the error.
+        Messages over locus_protocol.MAX_MESSAGE_SIZE close the
+        connection.
+
+Loci are computed once per (rounded) slider state and shared by all
+connections through an LRU cache. Cache misses are computed in batches in
+a pool of worker processes, so that the event loop keeps reading and
+answering other connections meanwhile.
+
+Run from the orbit-demo directory: python locus_service.py --port 8765
+
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from urllib.parse import urlsplit, parse_qsl
+
+import numpy as np
+
+from orbits import OrbitalState
+from orbits import conic_from_state
+from impulses import add_impulse_vector, calculate_impulse
+from toolkit.conics import get_conic_scale
+from locus_protocol import encode_loci, stamp_sequence
+from locus_protocol import parse_parameters, parse_message
+from locus_protocol import encode_frame, encode_close, read_message
+from locus_protocol import read_http_head, websocket_accept, MessageTooBig
+from locus_protocol import OP_BINARY, OP_TEXT, OP_CLOSE, CLOSE_TOO_BIG
+from locus_protocol import HOST, PORT
+
+# slider states are rounded to this resolution to share cache entries
+CACHE_RESOLUTION = 1e-4
+CACHE_SIZE = 4096
+MIN_SEGMENTS, MAX_SEGMENTS = 8, 3000
+
+
+def locus_payload(speed, angle, impulse_speed, impulse_angle, num_segment):
+    """Binary locus payload for one (rounded) slider state.
+
+    Raises ValueError for states with no finite locus, such as an impulse
+    cancelling the velocity.
+    """
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        # calculate old orbit
+        _old_state = OrbitalState.from_state_components(
+            1, 0, speed, np.deg2rad(angle)
+        )
+        _old_conic = conic_from_state(_old_state, gm=1)
+
+        # calculate new orbit
+        _impulse = calculate_impulse(
+            _old_state, impulse_speed, np.deg2rad(impulse_angle)
+        )
+        _new_state = add_impulse_vector(_old_state, _impulse)
+        _new_conic = conic_from_state(_new_state, gm=1)
+
+        # loci within the visible radius
+        _rmax = 1.3 * max(
+            get_conic_scale(c) for c in (_old_conic, _new_conic)
+        )
+        _scalars = [
+            _rmax,
+            _old_conic.l, _old_conic.e, _old_conic.angle0,
+            _new_conic.l, _new_conic.e, _new_conic.angle0,
+            *_old_state.position, *_old_state.velocity, *_impulse,
+        ]
+        if not np.all(np.isfinite(_scalars)):
+            raise ValueError("no finite orbit for this state")
+        return encode_loci(
+            _scalars,
+            _old_conic.view_locus(_rmax, num_segment),
+            _new_conic.view_locus(_rmax, num_segment),
+        )
+
+def locus_payloads(keys):
+    """Payloads (or the exceptions raised) for a batch of cache keys."""
+    _payloads = []
+    for _key in keys:
+        try:
+            _payloads.append(locus_payload(*_key))
+        except Exception as _error:
+            _payloads.append(_error)
+    return _payloads
+
+def cache_key(params):
+    """Rounded, clamped slider state: the arguments of locus_payload."""
+    _num_segment = min(max(params['num_segment'], MIN_SEGMENTS), MAX_SEGMENTS)
+    return (
+        round(params['speed'] / CACHE_RESOLUTION) * CACHE_RESOLUTION,
+        round(params['angle'] / CACHE_RESOLUTION) * CACHE_RESOLUTION,
+        round(params['impulse_speed'] / CACHE_RESOLUTION) * CACHE_RESOLUTION,
+        round(params['impulse_angle'] / CACHE_RESOLUTION) * CACHE_RESOLUTION,
+        _num_segment,
+    )
+
+
+class LocusCache:
+    """LRU cache of locus payloads, computing misses in an executor.
+
+    Misses are sent to the executor in batches, at most one batch in
+    flight per worker: misses arriving while every worker is busy are
+    computed together in the next batch, so that the cost of handing work
+    to a worker process is shared. Requests for a state already pending
+    wait for the same result. With executor None, misses are computed in
+    the loop's default (thread) executor.
+    """
+    def __init__(self, executor=None, workers=1, size=CACHE_SIZE):
+        """Initialiser."""
+        self.executor = executor
+        self.workers = workers
+        self.size = size
+        self.payloads = OrderedDict()
+        self.pending = {}
+        self.queued = []
+        self.batches = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __repr__(self):
+        return (
+            f"LocusCache({len(self.payloads)}/{self.size} payloads, "
+            f"{len(self.pending)} pending, {self.batches} batches)"
+        )
+
+    async def get(self, params):
+        """Payload for a slider state, with its seq stamped in the header."""
+        _key = cache_key(params)
+        _payload = self.payloads.get(_key)
+        if _payload is not None:
+            self.hits += 1
+            self.payloads.move_to_end(_key)
+        else:
+            _future = self.pending.get(_key)
+            if _future is None:
+                self.misses += 1
+                _future = asyncio.get_running_loop().create_future()
+                self.pending[_key] = _future
+                self.queued.append(_key)
+                self._dispatch()
+            # one waiter giving up must not cancel the others
+            _payload = await asyncio.shield(_future)
+        return stamp_sequence(_payload, params['seq'])
+
+    def _dispatch(self):
+        if self.batches >= self.workers or not self.queued:
+            return
+        _keys, self.queued = self.queued, []
+        self.batches += 1
+        _batch = asyncio.get_running_loop().run_in_executor(
+            self.executor, locus_payloads, _keys
+        )
+        _batch.add_done_callback(lambda f, _keys=_keys: self._store(_keys, f))
+
+    def _store(self, keys, batch):
+        self.batches -= 1
+        if batch.cancelled():
+            _results = [RuntimeError("batch cancelled")] * len(keys)
+        elif batch.exception() is not None:
+            # e.g. a worker process died
+            _results = [batch.exception()] * len(keys)
+        else:
+            _results = batch.result()
+
+        for _key, _result in zip(keys, _results):
+            _future = self.pending.pop(_key)
+            if isinstance(_result, Exception):
+                _future.set_exception(_result)
+                continue
+            _future.set_result(_result)
+            self.payloads[_key] = _result
+            if len(self.payloads) > self.size:
+                self.payloads.popitem(last=False)
+        self._dispatch()
+
+
+def http_response(status, content_type, body, keep_alive=True):
+    """Encode an HTTP/1.1 response."""
+    _head = (
+        f"HTTP/1.1 {status}\r\n"
+        f"Content-Type: {content_type}\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Access-Control-Allow-Origin: *\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+    )
+    return _head.encode('latin-1') + body
+
+
+class LocusConnection:
+    """Latest pending (unparsed) message of one WebSocket connection."""
+    def __init__(self):
+        """Initialiser."""
+        self.latest = None
+        self.ready = asyncio.Event()
+
+    def submit(self, message):
+        """Replace any pending message; returns True if one was dropped."""
+        _coalesced = self.latest is not None
+        self.latest = message
+        self.ready.set()
+        return _coalesced
+
+    async def next(self):
+        """Wait for and take the latest pending message."""
+        await self.ready.wait()
+        self.ready.clear()
+        message, self.latest = self.latest, None
+        return message
+
+
+class LocusServer:
+    """HTTP/WebSocket locus service."""
+    def __init__(self, host=HOST, port=PORT, executor=None, workers=1):
+        """Initialiser."""
+        self.host, self.port = host, port
+        self.server = None
+        self.cache = LocusCache(executor, workers)
+        self.stats = {
+            'connections' : 0,
+            'websockets' : 0,
+            'requests' : 0,
+            'coalesced' : 0,
+            'sent' : 0,
+            'errors' : 0,
+        }
+
+    async def start(self):
+        self.server = await asyncio.start_server(
+            self.handle_connection, self.host, self.port, backlog=4096
+        )
+        return self.server
+
+    async def serve_forever(self):
+        if self.server is None:
+            await self.start()
+        async with self.server:
+            await self.server.serve_forever()
+
+    def stats_report(self):
+        return {
+            **self.stats,
+            'cache_hits' : self.cache.hits,
+            'cache_misses' : self.cache.misses,
+            'cache_size' : len(self.cache.payloads),
+            'cache_pending' : len(self.cache.pending),
+            'cache_batches' : self.cache.batches,
+        }
+
+    async def handle_connection(self, reader, writer):
+        self.stats['connections'] += 1
+        try:
+            while True:
+                _start, _headers = await read_http_head(reader)
+                _method, _target, _ = _start.split(' ', 2)
+                _url = urlsplit(_target)
+
+                _keep_alive = _headers.get('connection', '').lower() != 'close'
+                if (_url.path == '/ws'
+                        and _headers.get('upgrade', '').lower() == 'websocket'):
+                    if 'sec-websocket-key' in _headers:
+                        await self.handle_websocket(reader, writer, _headers)
+                        break
+                    _response = (
+                        '400 Bad Request', 'text/plain',
+                        b'missing Sec-WebSocket-Key\n',
+                    )
+                else:
+                    _response = await self.handle_http(_method, _url)
+
+                writer.write(http_response(*_response, keep_alive=_keep_alive))
+                await writer.drain()
+                if not _keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+                ConnectionError, ValueError):
+            pass
+        finally:
+            self.stats['connections'] -= 1
+            writer.close()
+
+    async def handle_http(self, method, url):
+        """Status, content type and body for a plain HTTP request."""
+        if method != 'GET':
+            return '405 Method Not Allowed', 'text/plain', b'GET only\n'
+
+        if url.path == '/locus':
+            try:
+                _params = parse_parameters(dict(parse_qsl(url.query)))
+            except ValueError as _error:
+                return '400 Bad Request', 'text/plain', f"{_error}\n".encode()
+            self.stats['requests'] += 1
+            try:
+                _payload = await self.cache.get(_params)
+            except ValueError as _error:
+                return '400 Bad Request', 'text/plain', f"{_error}\n".encode()
+            except Exception as _error:
+                self.stats['errors'] += 1
+                return (
+                    '500 Internal Server Error', 'text/plain',
+                    f"locus failed: {_error!r}\n".encode(),
+                )
+            return '200 OK', 'application/octet-stream', _payload
+
+        if url.path == '/stats':
+            _body = json.dumps(self.stats_report()).encode()
+            return '200 OK', 'application/json', _body
+
+        return '404 Not Found', 'text/plain', b'not found\n'
+
+    async def handle_websocket(self, reader, writer, headers):
+        writer.write((
+            "HTTP/1.1 101 Switching Protocols\r\n"
+            "Upgrade: websocket\r\n"
+            "Connection: Upgrade\r\n"
+            f"Sec-WebSocket-Accept: "
+            f"{websocket_accept(headers['sec-websocket-key'])}\r\n\r\n"
+        ).encode('latin-1'))
+
+        self.stats['websockets'] += 1
+        _connection = LocusConnection()
+        _sender = asyncio.create_task(self._send_loci(writer, _connection))
+        try:
+            while True:
+                try:
+                    _opcode, _payload = await read_message(reader, writer)
+                except MessageTooBig as _error:
+                    writer.write(encode_close(CLOSE_TOO_BIG, str(_error)))
+                    break
+                if _opcode == OP_CLOSE:
+                    writer.write(encode_frame(OP_CLOSE, _payload[:2]))
+                    break
+                self.stats['requests'] += 1
+                self.stats['coalesced'] += _connection.submit(_payload)
+        finally:
+            self.stats['websockets'] -= 1
+            _sender.cancel()
+
+    async def _send_loci(self, writer, connection):
+        # messages arriving while a payload is computed or sent replace
+        # each other, and only the one taken is parsed
+        while True:
+            _message = await connection.next()
+            try:
+                _payload = await self.cache.get(parse_message(_message))
+            except ValueError as _error:
+                writer.write(encode_frame(OP_TEXT, str(_error).encode()))
+                continue
+            except Exception as _error:
+                self.stats['errors'] += 1
+                writer.write(encode_frame(
+                    OP_TEXT, f"locus failed: {_error!r}".encode()
+                ))
+                continue
+            writer.write(encode_frame(OP_BINARY, _payload))
+            self.stats['sent'] += 1
+            await writer.drain()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='orbit-demo locus service')
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help='processes computing loci; 0 computes them in '
+                             'threads of the service process')
+    args = parser.parse_args()
+
+    # spawned rather than forked, so that workers do not hold the socket
+    _executor = ProcessPoolExecutor(
+        args.workers, mp_context=multiprocessing.get_context('spawn')
+    ) if args.workers else None
+    with _executor or nullcontext():
+        _server = LocusServer(
+            args.host, args.port, _executor, max(args.workers, 1)
+        )
+        print(f"serving on http://{args.host}:{args.port}")
+        try:
+            asyncio.run(_server.serve_forever())
+        except KeyboardInterrupt:
+            pass
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,8 @@
+import argparse
+
 import matplotlib.pyplot as plt
-from visualisation import OrbitImpulseUI
+from visualisation import OrbitImpulseUI, CONIC_ARTISTS
+from visualisation.session import SessionRecorder, replay_session
 
 FIG_TITLE = 'OrbitDemo'
 FIGSIZE = [16, 8]
@@ -10,12 +13,42 @@ YEAR = '2023'
 
 INIT_SPEED, INIT_ANGLE = 1., 0.
 SCALE = 1
+STYLE = 'fivethirtyeight'
 
 def copyright_notice(author, year):
     return f"\u00A9 {author} {year}"
 
+def parse_args():
+    parser = argparse.ArgumentParser(prog='orbit-demo', description=PAGE_TITLE)
+    parser.add_argument(
+        '--render-mode', choices=list(CONIC_ARTISTS), default=None,
+        help='how to draw orbits (default: path, or as recorded on replay)',
+    )
+    parser.add_argument(
+        '--record', metavar='FILE',
+        help='record slider, button and playback events to FILE',
+    )
+    parser.add_argument(
+        '--replay', metavar='FILE',
+        help='replay a recorded session headlessly and report latencies',
+    )
+    parser.add_argument(
+        '--realtime', action='store_true',
+        help='replay events at their recorded times',
+    )
+    return parser.parse_args()
+
 def main():    
-    with plt.style.context('fivethirtyeight'):
+    args = parse_args()
+
+    if args.replay:
+        report = replay_session(
+            args.replay, args.render_mode, args.realtime, style=STYLE
+        )
+        print(report.summary())
+        return
+
+    with plt.style.context(STYLE):
         fig = plt.figure(PAGE_TITLE, FIGSIZE)
 
         fig.suptitle(
@@ -32,8 +65,17 @@ def main():
             fontsize='xx-small',
         )
 
-        ui = OrbitImpulseUI(fig, INIT_SPEED, INIT_ANGLE, SCALE)
-        plt.show()
+        ui = OrbitImpulseUI(
+            fig, INIT_SPEED, INIT_ANGLE, SCALE,
+            render_mode=args.render_mode or 'path',
+        )
+
+        if args.record:
+            recorder = SessionRecorder(ui, args.record)
+            plt.show()
+            recorder.close()
+        else:
+            plt.show()
 
 if __name__=="__main__":
     main()
@@ -3,12 +3,13 @@
 """
 
 import numpy as np
-import matplotlib.pyplot as plt
 
 from orbits_toolkit import orbital_elements_from_state
 from orbits_toolkit import orbital_state_from_elements
+from orbits_toolkit_3d import orbital_elements_from_state_3d
 from toolkit.vector import Vector2D
 from toolkit.conics import ConicSection
+from toolkit.kepler import propagate_true_anomaly
 from toolkit import angle_add, angle_sub
 
 from numpy import pi as PI
@@ -60,6 +61,25 @@ class OrbitalElements:
 
         return cls(*_elements)
 
+    @classmethod
+    def from_state_3d(cls, position, velocity, gm):
+        """Create in-plane OrbitalElements from (N, 3) position & velocity.
+
+        Angles are measured counterclockwise about the z-axis, as in the
+        planar elements, so planar states give the same elements as
+        from_state.
+        """
+        (l, e, inclination, raan,
+         periapsis_argument, true_anomaly) = orbital_elements_from_state_3d(
+            position, velocity, gm
+        )
+
+        # retrograde orbits run clockwise when viewed from +z
+        _sense = np.where(np.cos(inclination) < 0, -1, 1)
+        periapsis_angle = (raan + _sense * periapsis_argument) % (2 * PI)
+
+        return cls(l, e, periapsis_angle, _sense * true_anomaly)
+
     
 class OrbitalState:
     def __init__(self, position, velocity):
@@ -113,6 +133,21 @@ class OrbitalState:
 
         return cls.from_state_components(*_components)
 
+def propagate_elements(elements, gm, dt):
+    """Advance OrbitalElements along their conic by time dt."""
+    _true_anomaly = propagate_true_anomaly(
+        elements.true_anomaly,
+        elements.eccentricity,
+        elements.semilatus_rectum,
+        gm, dt,
+    )
+    return OrbitalElements(
+        elements.semilatus_rectum,
+        elements.eccentricity,
+        elements.periapsis_angle,
+        _true_anomaly,
+    )
+
 def conic_from_elements(elements):
     """Calculate conic section from a complete set of orbital elements."""
     return ConicSection(
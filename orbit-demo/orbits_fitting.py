@@ -0,0 +1,204 @@
+"""orbits_fitting.py
+
+Batch orbit determination: fit conic sections to tracks of noisy polar
+observations (radius, angle) of many objects at once.
+
+Tracks are stacked into arrays of shape (num_objects, num_points). Tracks
+with fewer points can be padded with NaN; padded entries are ignored.
+Tracks with fewer than MIN_POINTS distinct observation angles cannot
+determine a conic; they are flagged invalid and given NaN results.
+
+"""
+
+import numpy as np
+
+from orbits import OrbitalElements
+from toolkit.conics import ConicSection
+from toolkit import angle_sub
+
+# parameters (l, e cos w, e sin w) need three distinct angles
+MIN_POINTS = 3
+
+
+def _normal_solve(jac, res, weights):
+    """Solve batched weighted least squares jac @ x = res (normal equations)."""
+    _jwt = np.swapaxes(jac * weights[..., None], -1, -2)
+    _jtj = _jwt @ jac
+    _jtr = _jwt @ res[..., None]
+    return np.linalg.solve(_jtj, _jtr)[..., 0], _jtj
+
+
+def determined_tracks(radius, angle):
+    """Whether each track has MIN_POINTS distinct valid angles."""
+    _valid = np.isfinite(radius) & np.isfinite(angle)
+    _angle = np.sort(np.where(_valid, angle % (2 * np.pi), np.nan), axis=-1)
+    _distinct = np.isfinite(_angle)
+    _distinct[..., 1:] &= np.diff(_angle, axis=-1) > 0
+    return _distinct.sum(axis=-1) >= MIN_POINTS
+
+
+def initial_conic_guess(radius, angle):
+    """Closed-form estimate of (l, e cos w, e sin w) for stacked tracks.
+
+    The conic equation is linear in 1/r:
+        1/r = 1/l + (e cos w / l) cos(angle) + (e sin w / l) sin(angle)
+    so a batched linear least squares fit gives the initial guess.
+    Undetermined tracks give NaN.
+    """
+    radius = np.atleast_2d(np.asarray(radius, dtype=float))
+    angle = np.atleast_2d(np.asarray(angle, dtype=float))
+    _weights = np.isfinite(radius) & np.isfinite(angle)
+    _u = np.where(_weights, 1. / radius, 0.)
+    _c = np.where(_weights, np.cos(angle), 0.)
+    _s = np.where(_weights, np.sin(angle), 0.)
+
+    # solve only the determined tracks
+    _rows = determined_tracks(radius, angle)
+    _coef = np.full(_u.shape[:-1] + (3,), np.nan)
+    _design = np.stack([np.ones_like(_u), _c, _s], axis=-1)
+    _coef[_rows], _ = _normal_solve(
+        _design[_rows], _u[_rows], _weights[_rows].astype(float)
+    )
+    _a, _b, _d = np.moveaxis(_coef, -1, 0)
+
+    l = 1. / _a
+    return l, _b * l, _d * l
+
+
+def _conic_radius_jacobian(l, ex, ey, c, s):
+    """Model radii and derivatives with respect to (l, ex, ey)."""
+    _denom = 1 + ex[:, None] * c + ey[:, None] * s
+    r = l[:, None] / _denom
+    _rsq_l = r * r / l[:, None]
+    return r, np.stack([r / l[:, None], -_rsq_l * c, -_rsq_l * s], axis=-1)
+
+
+class OrbitFit:
+    """Result of a batched orbit fit.
+
+    valid flags the tracks that determine a conic, and converged those
+    whose Gauss-Newton steps fell below the tolerance.
+    """
+    def __init__(self, elements, covariance, rms, iterations, valid,
+                 converged):
+        """Initialiser."""
+        self.elements = elements
+        self.covariance = covariance
+        self.rms = rms
+        self.iterations = iterations
+        self.valid = valid
+        self.converged = converged
+
+    def __repr__(self):
+        return (
+            f"OrbitFit({len(self)} objects, {self.valid.sum()} valid, "
+            f"{self.converged.sum()} converged)"
+        )
+
+    def __len__(self):
+        return len(self.rms)
+
+    def conic(self, index):
+        """ConicSection for a single fitted object."""
+        return ConicSection(
+            self.elements.eccentricity[index],
+            self.elements.semilatus_rectum[index],
+            self.elements.periapsis_angle[index],
+        )
+
+
+def fit_orbits(radius, angle, max_iterations=20, tolerance=1e-10):
+    """Fit conic sections to stacked (radius, angle) tracks.
+
+    Starts from initial_conic_guess and refines with batched Gauss-Newton
+    iterations on the radius residuals; each object stops once its step
+    falls below tolerance. Returns an OrbitFit holding OrbitalElements of
+    arrays (true anomaly at each track's last valid point), the
+    (l, e, periapsis_angle) covariance matrices with shape
+    (num_objects, 3, 3), the rms radius residual of each track, the
+    number of iterations taken by each object and the valid and converged
+    masks. Invalid tracks have NaN elements, covariance and rms.
+    """
+    radius = np.atleast_2d(np.asarray(radius, dtype=float))
+    angle = np.atleast_2d(np.asarray(angle, dtype=float))
+    _num_objects = len(radius)
+
+    # fit only the tracks that determine a conic
+    valid = determined_tracks(radius, angle)
+    _rows = np.flatnonzero(valid)
+    radius, angle = radius[_rows], angle[_rows]
+
+    # ignore padded observations
+    _valid = np.isfinite(radius) & np.isfinite(angle)
+    _weights = _valid.astype(float)
+    _r_obs = np.where(_valid, radius, 0.)
+    _c = np.where(_valid, np.cos(angle), 0.)
+    _s = np.where(_valid, np.sin(angle), 0.)
+
+    # parameters (l, e cos w, e sin w) are regular for circular orbits
+    _params = np.stack(initial_conic_guess(radius, angle), axis=-1)
+
+    # iterate on the objects that have not yet converged
+    _converged = np.zeros(len(_rows), dtype=bool)
+    _iterations = np.zeros(len(_rows), dtype=int)
+    for _ in range(max_iterations):
+        _active = np.flatnonzero(~_converged)
+        if len(_active) == 0:
+            break
+        _p = _params[_active]
+        _r, _jac = _conic_radius_jacobian(*_p.T, _c[_active], _s[_active])
+        _step, _ = _normal_solve(
+            _jac, _r_obs[_active] - _r, _weights[_active]
+        )
+        _params[_active] = _p + _step
+        _iterations[_active] += 1
+
+        # relative step size
+        _scale = np.maximum(np.abs(_params[_active, :1]), 1.)
+        _size = np.abs(_step) / _scale
+        _converged[_active] = np.all(_size < tolerance, axis=-1)
+
+    # residuals and normal matrix at solution
+    _r, _jac = _conic_radius_jacobian(*_params.T, _c, _s)
+    _res = np.where(_valid, _r_obs - _r, 0.)
+    _jtj = np.swapaxes(_jac * _weights[..., None], -1, -2) @ _jac
+
+    _num = _valid.sum(axis=-1)
+    _rss = np.sum(_res * _res, axis=-1)
+    _rms = np.sqrt(_rss / _num)
+    _sigma_sq = _rss / np.maximum(_num - 3, 1)
+    _cov = np.linalg.inv(_jtj) * _sigma_sq[:, None, None]
+
+    # convert to classical elements
+    l, ex, ey = _params.T
+    e = np.hypot(ex, ey)
+    periapsis_angle = np.arctan2(ey, ex) % (2 * np.pi)
+
+    # propagate covariance into (l, e, periapsis_angle)
+    _transform = np.zeros_like(_cov)
+    _transform[:, 0, 0] = 1.
+    _transform[:, 1, 1], _transform[:, 1, 2] = ex / e, ey / e
+    _transform[:, 2, 1], _transform[:, 2, 2] = -ey / (e * e), ex / (e * e)
+    _covariance = _transform @ _cov @ np.swapaxes(_transform, -1, -2)
+
+    # true anomaly at the last valid observation
+    _last = _valid.shape[-1] - 1 - np.argmax(_valid[:, ::-1], axis=-1)
+    _last_angle = np.take_along_axis(angle, _last[:, None], axis=-1)[:, 0]
+    true_anomaly = angle_sub(_last_angle, periapsis_angle)
+
+    # scatter back, with NaN for undetermined tracks
+    _elements = np.full((4, _num_objects), np.nan)
+    _elements[:, _rows] = l, e, periapsis_angle, true_anomaly
+    covariance = np.full((_num_objects, 3, 3), np.nan)
+    covariance[_rows] = _covariance
+    rms = np.full(_num_objects, np.nan)
+    rms[_rows] = _rms
+    iterations = np.zeros(_num_objects, dtype=int)
+    iterations[_rows] = _iterations
+    converged = np.zeros(_num_objects, dtype=bool)
+    converged[_rows] = _converged
+
+    elements = OrbitalElements(*_elements)
+    return OrbitFit(
+        elements, covariance, rms, iterations, valid, converged
+    )
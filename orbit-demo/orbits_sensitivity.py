@@ -0,0 +1,133 @@
+"""orbits_sensitivity.py
+
+Analytic Jacobians of the conversions in orbits_toolkit and of the impulse
+calculation. All functions broadcast over array inputs; the Jacobian is
+returned with the two matrix axes last, i.e. with shape (..., m, n) where
+J[..., i, j] = d(output_i) / d(input_j).
+
+"""
+
+import numpy as np
+
+from orbits_toolkit import orbital_elements_from_state
+from orbits_toolkit import orbital_state_from_elements
+
+
+def _stack_jacobian(rows):
+    """Assemble rows of (broadcastable) derivatives into shape (..., m, n)."""
+    _shape = np.broadcast_shapes(*[np.shape(x) for row in rows for x in row])
+    _jac = np.zeros(_shape + (len(rows), len(rows[0])))
+    for i, row in enumerate(rows):
+        for j, x in enumerate(row):
+            _jac[..., i, j] = x
+    return _jac
+
+
+def orbital_elements_jacobian(position_radius, position_angle,
+                              flight_speed, flight_angle, gm):
+    """Orbital elements and their Jacobian with respect to the state.
+
+    Rows are (l, e, periapsis_angle, true_anomaly), columns are
+    (position_radius, position_angle, flight_speed, flight_angle). The
+    eccentricity is not differentiable at e = 0, so for circular orbits the
+    e row and the angular rows are NaN (or infinite).
+    """
+    # forward conversion
+    _elements = orbital_elements_from_state(
+        position_radius, position_angle, flight_speed, flight_angle, gm
+    )
+    l, e, _, _ = _elements
+
+    # precompute trig
+    _c, _s = np.cos(flight_angle), np.sin(flight_angle)
+
+    # normalised speed parameter = (v / vcirc)**2 and its derivatives
+    _vsq = flight_speed * flight_speed * position_radius / gm
+    _dvsq_dr = _vsq / position_radius
+    _dvsq_dv = 2 * _vsq / flight_speed
+
+    # semilatus rectum
+    dl_dr = 2 * l / position_radius
+    dl_dv = 2 * l / flight_speed
+    dl_dg = -2 * position_radius * _vsq * _c * _s
+
+    # eccentricity and true anomaly: undefined for circular orbits
+    with np.errstate(divide='ignore', invalid='ignore'):
+        _de_dvsq = _c * _c * (_vsq - 1) / e
+        de_dr = _de_dvsq * _dvsq_dr
+        de_dv = _de_dvsq * _dvsq_dv
+        de_dg = _c * _s * _vsq * (2 - _vsq) / e
+
+        _esq = e * e
+        _df_dvsq = -_s * _c / _esq
+        df_dr = _df_dvsq * _dvsq_dr
+        df_dv = _df_dvsq * _dvsq_dv
+        df_dg = _vsq * (_vsq * _c * _c - np.cos(2 * flight_angle)) / _esq
+
+    jacobian = _stack_jacobian([
+        [dl_dr, 0, dl_dv, dl_dg],
+        [de_dr, 0, de_dv, de_dg],
+        [-df_dr, 1, -df_dv, -df_dg],
+        [df_dr, 0, df_dv, df_dg],
+    ])
+    return _elements, jacobian
+
+
+def orbital_state_jacobian(l, e, periapsis_angle, true_anomaly, gm):
+    """Orbital state and its Jacobian with respect to the elements.
+
+    Rows are (position_radius, position_angle, flight_speed, flight_angle),
+    columns are (l, e, periapsis_angle, true_anomaly).
+    """
+    # forward conversion
+    _state = orbital_state_from_elements(l, e, periapsis_angle, true_anomaly, gm)
+    position_radius, _, flight_speed, _ = _state
+
+    # precompute trig
+    _c, _s = np.cos(true_anomaly), np.sin(true_anomaly)
+
+    # orbital distance
+    _rsq_l = position_radius * position_radius / l
+    dr_dl = position_radius / l
+    dr_de = -_rsq_l * _c
+    dr_df = _rsq_l * e * _s
+
+    # flight speed
+    _gm_lv = gm / (l * flight_speed)
+    dv_dl = -0.5 * flight_speed / l
+    dv_de = _gm_lv * (_c + e)
+    dv_df = -_gm_lv * e * _s
+
+    # flight path angle
+    _q = 1 + 2 * e * _c + e * e
+    dg_de = _s / _q
+    dg_df = e * (_c + e) / _q
+
+    jacobian = _stack_jacobian([
+        [dr_dl, dr_de, 0, dr_df],
+        [0, 0, 1, 1],
+        [dv_dl, dv_de, 0, dv_df],
+        [0, dg_de, 0, dg_df],
+    ])
+    return _state, jacobian
+
+
+def impulse_jacobian(magnitude, angle, flight_heading):
+    """Impulse components and their Jacobian, batched over arrays.
+
+    Vectorised counterpart of impulses.calculate_impulse. Rows are the
+    (x, y) components of the impulse, columns are
+    (magnitude, angle, flight_heading).
+    """
+    # impulse direction in the x-y frame
+    _heading = angle + flight_heading
+    _c, _s = np.cos(_heading), np.sin(_heading)
+
+    # impulse vector
+    _dvx, _dvy = magnitude * _c, magnitude * _s
+
+    jacobian = _stack_jacobian([
+        [_c, -_dvy, -_dvy],
+        [_s, _dvx, _dvx],
+    ])
+    return (_dvx, _dvy), jacobian
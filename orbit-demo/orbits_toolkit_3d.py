@@ -0,0 +1,165 @@
+"""orbits_toolkit_3d.py
+
+Batched conversion between 3D position & velocity and the six classical
+orbital elements, and out-of-plane impulses.
+
+Positions and velocities are (N, 3) arrays. Elements are returned as
+(semilatus rectum, eccentricity, inclination, right ascension of the
+ascending node, argument of periapsis, true anomaly). Work is done in
+chunks of CHUNK_SIZE rows to bound the memory used by temporaries.
+
+For equatorial orbits the ascending node is undefined; it is taken to lie
+on the x-axis, so for planar prograde input the argument of periapsis and
+true anomaly agree with orbits_toolkit.orbital_elements_from_state.
+
+"""
+
+import numpy as np
+
+from toolkit import TWO_PI
+
+CHUNK_SIZE = 2 ** 20
+
+# node vectors shorter than this (relative to |h|) count as equatorial
+EQUATORIAL_TOLERANCE = 1e-12
+
+
+def _chunked(function, arrays, output_shapes):
+    """Apply function to row chunks of arrays, collecting into outputs.
+
+    output_shapes gives the trailing shape of each output, per row.
+    """
+    _num = len(arrays[0])
+    outputs = [np.empty((_num,) + _shape) for _shape in output_shapes]
+    for _start in range(0, _num, CHUNK_SIZE):
+        _chunk = slice(_start, _start + CHUNK_SIZE)
+        _results = function(*[_a[_chunk] for _a in arrays])
+        for _out, _res in zip(outputs, _results):
+            _out[_chunk] = _res
+    return outputs
+
+
+def _elements_from_state(position, velocity, gm):
+    """Classical elements for one chunk of states."""
+    _x, _y, _z = position.T
+    _vx, _vy, _vz = velocity.T
+
+    # angular momentum
+    _hx = _y * _vz - _z * _vy
+    _hy = _z * _vx - _x * _vz
+    _hz = _x * _vy - _y * _vx
+    _h = np.sqrt(_hx * _hx + _hy * _hy + _hz * _hz)
+
+    # radius and radial velocity
+    _r = np.sqrt(_x * _x + _y * _y + _z * _z)
+    _vr = (_x * _vx + _y * _vy + _z * _vz) / _r
+
+    # size and shape, via eccentricity vector components along the
+    # radial and transverse directions
+    l = _h * _h / gm
+    _er = l / _r - 1
+    _et = _vr * _h / gm
+    e = np.hypot(_er, _et)
+    true_anomaly = np.arctan2(_et, _er)
+
+    # orientation of the orbital plane
+    inclination = np.arccos(np.clip(_hz / _h, -1, 1))
+    _nx, _ny = -_hy, _hx
+    _n = np.hypot(_nx, _ny)
+    _equatorial = _n <= EQUATORIAL_TOLERANCE * _h
+    _nx = np.where(_equatorial, 1., _nx / np.where(_equatorial, 1., _n))
+    _ny = np.where(_equatorial, 0., _ny / np.where(_equatorial, 1., _n))
+    raan = np.arctan2(_ny, _nx) % TWO_PI
+
+    # argument of latitude: angle from node to position about h
+    _cos_u = (_nx * _x + _ny * _y) / _r
+    _sin_u = (
+        _hx * (_ny * _z) - _hy * (_nx * _z) + _hz * (_nx * _y - _ny * _x)
+    ) / (_r * _h)
+    _latitude = np.arctan2(_sin_u, _cos_u)
+
+    periapsis_argument = (_latitude - true_anomaly) % TWO_PI
+    return l, e, inclination, raan, periapsis_argument, true_anomaly
+
+
+def _state_from_elements(l, e, inclination, raan, periapsis_argument,
+                         true_anomaly, gm):
+    """Position & velocity for one chunk of elements."""
+    _c, _s = np.cos(true_anomaly), np.sin(true_anomaly)
+
+    # radius, radial & transverse speed
+    _r = l / (1 + e * _c)
+    _k = np.sqrt(gm / l)
+    _vr, _vt = _k * e * _s, _k * (1 + e * _c)
+
+    # radial and transverse unit vectors from the argument of latitude
+    _latitude = periapsis_argument + true_anomaly
+    _cu, _su = np.cos(_latitude), np.sin(_latitude)
+    _cO, _sO = np.cos(raan), np.sin(raan)
+    _ci, _si = np.cos(inclination), np.sin(inclination)
+
+    _radial = np.stack([
+        _cO * _cu - _sO * _su * _ci,
+        _sO * _cu + _cO * _su * _ci,
+        _su * _si,
+    ], axis=-1)
+    _transverse = np.stack([
+        -_cO * _su - _sO * _cu * _ci,
+        -_sO * _su + _cO * _cu * _ci,
+        _cu * _si,
+    ], axis=-1)
+
+    position = _r[:, None] * _radial
+    velocity = _vr[:, None] * _radial + _vt[:, None] * _transverse
+    return position, velocity
+
+
+def orbital_elements_from_state_3d(position, velocity, gm):
+    """Calculate classical orbital elements from (N, 3) position & velocity."""
+    position = np.atleast_2d(np.asarray(position, dtype=float))
+    velocity = np.atleast_2d(np.asarray(velocity, dtype=float))
+    return tuple(_chunked(
+        lambda r, v: _elements_from_state(r, v, gm),
+        (position, velocity), ((),) * 6,
+    ))
+
+
+def orbital_state_from_elements_3d(l, e, inclination, raan,
+                                   periapsis_argument, true_anomaly, gm):
+    """Calculate (N, 3) position & velocity from classical orbital elements."""
+    _elements = np.broadcast_arrays(*map(np.atleast_1d, (
+        l, e, inclination, raan, periapsis_argument, true_anomaly
+    )))
+    return tuple(_chunked(
+        lambda *el: _state_from_elements(*el, gm),
+        [np.asarray(_el, dtype=float) for _el in _elements], ((3,), (3,)),
+    ))
+
+
+def calculate_impulse_3d(position, velocity, magnitude, angle, elevation=0):
+    """Calculate (N, 3) impulse vectors relative to velocity.
+
+    angle is measured in the orbital plane from the velocity,
+    counterclockwise as seen from the +z side of the plane; elevation tilts
+    the impulse out of the plane towards that side. For equatorial states,
+    prograde or retrograde, this is the convention of
+    impulses.calculate_impulse.
+    """
+    position = np.atleast_2d(np.asarray(position, dtype=float))
+    velocity = np.atleast_2d(np.asarray(velocity, dtype=float))
+
+    # orthonormal frame: along velocity, in-plane normal, out-of-plane;
+    # the plane normal is taken on the +z side, not along h
+    _along = velocity / np.linalg.norm(velocity, axis=-1, keepdims=True)
+    _normal = np.cross(position, velocity)
+    _normal /= np.linalg.norm(_normal, axis=-1, keepdims=True)
+    _normal *= np.where(_normal[:, 2:] < 0, -1., 1.)
+    _side = np.cross(_normal, _along)
+
+    magnitude, angle, elevation = (
+        np.asarray(_x, dtype=float)[..., None]
+        for _x in (magnitude, angle, elevation)
+    )
+    _in_plane = np.cos(angle) * _along + np.sin(angle) * _side
+    return magnitude * (np.cos(elevation) * _in_plane
+                        + np.sin(elevation) * _normal)
@@ -0,0 +1,380 @@
+"""patched_conics.py
+
+Patched-conic propagation of many spacecraft through a hierarchy of bodies
+(e.g. a planet and its moons), for flybys and gravity assists.
+
+Each body moves on its own conic about its parent and attracts spacecraft
+within its sphere of influence (SOI). A spacecraft follows a conic about
+its current primary until it leaves the primary's SOI or enters the SOI of
+one of the primary's children; its state is then re-expressed as orbital
+elements relative to the new primary.
+
+SOI crossings are searched for on a grid of sample times, for all
+spacecraft and samples at once, and refined by vectorised bisection. The
+sample spacing must be short compared with the time spent crossing an
+SOI, or grazing passages may be missed.
+
+"""
+
+import numpy as np
+
+from orbits import OrbitalElements
+from orbits_toolkit_3d import CHUNK_SIZE
+from conjunctions import ConicTracks, conic_shells
+
+NUM_BISECTIONS = 50
+MAX_TRANSITIONS = 100
+
+
+def laplace_radius(l, e, gm, parent_gm):
+    """Laplace sphere of influence radius of a body on an elliptic orbit."""
+    _a = l / (1 - e * e)
+    return _a * (gm / parent_gm) ** 0.4
+
+
+def elements_from_state(x, y, vx, vy, gm):
+    """Planar OrbitalElements and sense of motion (+1 anticlockwise).
+
+    Vectorised over arrays of states; retrograde (clockwise) states are
+    described as in OrbitalElements.from_state_3d.
+    """
+    _zero = np.zeros(np.shape(x))
+    elements = OrbitalElements.from_state_3d(
+        np.column_stack([x, y, _zero]), np.column_stack([vx, vy, _zero]), gm
+    )
+    sense = np.where(x * vy - y * vx < 0, -1, 1)
+    return elements, sense
+
+
+class Body:
+    """An attracting body, on a conic orbit about its parent."""
+    def __init__(self, name, gm, parent=None, elements=None, soi_radius=None):
+        """Initialiser.
+
+        elements are relative to the parent, with the true anomaly at t = 0.
+        The SOI radius defaults to the Laplace radius; the root body's SOI
+        is unbounded.
+        """
+        self.name = name
+        self.gm = gm
+        self.parent = parent
+        self.elements = elements
+
+        if parent is None:
+            soi_radius = np.inf
+        elif soi_radius is None:
+            soi_radius = laplace_radius(
+                elements.semilatus_rectum, elements.eccentricity,
+                gm, parent.gm,
+            )
+        self.soi_radius = soi_radius
+
+    def __repr__(self):
+        _parent = None if self.parent is None else self.parent.name
+        return f"Body({self.name!r}, {self.gm!r}, parent={_parent!r})"
+
+
+class PatchedConicSystem:
+    """A root body and bodies orbiting it (or each other)."""
+    def __init__(self, bodies):
+        """Initialiser.
+
+        bodies[0] is the root; every other body must follow its parent.
+        """
+        self.bodies = list(bodies)
+        self.index = {_body.name: _k for _k, _body in enumerate(self.bodies)}
+        if self.bodies[0].parent is not None:
+            raise ValueError("first body must be the root")
+        for _k, _body in enumerate(self.bodies[1:], 1):
+            if self.index.get(getattr(_body.parent, 'name', None), _k) >= _k:
+                raise ValueError(f"{_body.name!r} must follow its parent")
+
+        self.parent = np.array(
+            [-1] + [self.index[_b.parent.name] for _b in self.bodies[1:]]
+        )
+        self.gm = np.array([_b.gm for _b in self.bodies], dtype=float)
+        self.soi_radius = np.array(
+            [_b.soi_radius for _b in self.bodies], dtype=float
+        )
+
+        # orbits of all bodies but the root, indexed by body - 1
+        _elements = [list(_b.elements) for _b in self.bodies[1:]]
+        _l, _e, _w, _f = np.array(_elements, dtype=float).reshape(-1, 4).T
+        self.orbits = ConicTracks(
+            OrbitalElements(_l, _e, _w, _f), self.gm[self.parent[1:]]
+        )
+
+    def __repr__(self):
+        return f"PatchedConicSystem({[_b.name for _b in self.bodies]!r})"
+
+    def __len__(self):
+        return len(self.bodies)
+
+    def children(self, body):
+        """Indices of the bodies orbiting body."""
+        return np.flatnonzero(self.parent == body)
+
+    def body_positions(self, t):
+        """Positions (x, y) of all bodies at times t, relative to the root.
+
+        Each has shape (number of bodies,) + shape of t.
+        """
+        t = np.asarray(t, dtype=float)
+        x, y = np.zeros((2, len(self)) + t.shape)
+        for _b in range(1, len(self)):
+            _x, _y = self.orbits.position(t, _b - 1)
+            x[_b] = x[self.parent[_b]] + _x
+            y[_b] = y[self.parent[_b]] + _y
+        return x, y
+
+
+class SOITransitions:
+    """SOI crossings found by propagate_patched_conics, in time order."""
+    def __init__(self, craft, time, old_primary, new_primary, elements,
+                 sense):
+        """Initialiser.
+
+        elements are relative to the new primary at the crossing time.
+        """
+        self.craft = craft
+        self.time = time
+        self.old_primary, self.new_primary = old_primary, new_primary
+        self.elements = elements
+        self.sense = sense
+
+    def __repr__(self):
+        return f"SOITransitions({len(self)} transitions)"
+
+    def __len__(self):
+        return len(self.time)
+
+
+class PatchedTrajectories:
+    """Spacecraft trajectories as a sequence of conic legs."""
+    def __init__(self, system, num_craft, legs, transitions):
+        """Initialiser.
+
+        Each leg is (craft indices, primaries, start times, ConicTracks);
+        later legs of a spacecraft supersede earlier ones.
+        """
+        self.system = system
+        self.num_craft = num_craft
+        self.legs = legs
+        self.transitions = transitions
+
+    def __repr__(self):
+        return (
+            f"PatchedTrajectories({self.num_craft} spacecraft, "
+            f"{len(self.transitions)} transitions)"
+        )
+
+    def primary(self, times):
+        """Primary body of each spacecraft at times: shape (T, N)."""
+        times = np.asarray(times, dtype=float)[:, None]
+        primary = np.zeros((len(times), self.num_craft), dtype=int)
+        for _craft, _primary, _start, _ in self.legs:
+            primary[:, _craft] = np.where(
+                times >= _start, _primary, primary[:, _craft]
+            )
+        return primary
+
+    def positions(self, times):
+        """Positions (x, y) of each spacecraft at times, relative to the root.
+
+        Each has shape (T, N); times before the first leg are NaN.
+        """
+        times = np.asarray(times, dtype=float)
+        _bx, _by = self.system.body_positions(times)
+        x, y = np.full((2, len(times), self.num_craft), np.nan)
+        for _craft, _primary, _start, _tracks in self.legs:
+            _x, _y = _tracks.position(times[:, None])
+            _later = times[:, None] >= _start
+            x[:, _craft] = np.where(_later, _bx[_primary].T + _x, x[:, _craft])
+            y[:, _craft] = np.where(_later, _by[_primary].T + _y, y[:, _craft])
+        return x, y
+
+
+def _first_crossings(system, tracks, primary, start, times):
+    """Sample index and new primary of each spacecraft's next SOI crossing.
+
+    Returns (index, target); index is len(times) where there is none.
+    """
+    _num_times = len(times)
+    index = np.full(len(tracks), _num_times)
+    target = np.full(len(tracks), -1)
+
+    # body positions relative to their parents at every sample
+    _bx, _by = np.zeros((2, len(system), _num_times))
+    if len(system) > 1:
+        _bx[1:], _by[1:] = system.orbits.position(
+            times[None, :], np.arange(len(system) - 1)[:, None]
+        )
+
+    # shell filter: only spacecraft whose [periapsis, apoapsis] shells
+    # reach the primary's SOI boundary or a child's SOI are screened
+    _rp, _ra = conic_shells(tracks.e, tracks.l)
+    _brp, _bra = conic_shells(system.orbits.e, system.orbits.l)
+    _reachable = _ra > system.soi_radius[primary]
+    for _child in range(1, len(system)):
+        _soi = system.soi_radius[_child]
+        _reachable |= (
+            (primary == system.parent[_child])
+            & (_rp <= _bra[_child - 1] + _soi)
+            & (_brp[_child - 1] <= _ra + _soi)
+        )
+    _reachable = np.flatnonzero(_reachable)
+
+    # spacecraft are screened in chunks of CHUNK_SIZE (time, craft) points
+    _chunk_size = max(CHUNK_SIZE // _num_times, 1)
+    for _first in range(0, len(_reachable), _chunk_size):
+        _chunk = _reachable[_first:_first + _chunk_size]
+        _primary = primary[_chunk]
+        _x, _y = tracks.position(times[:, None], _chunk)
+        _later = times[:, None] > start[_chunk]
+
+        # candidate transitions: exit from the primary's SOI ...
+        _candidates = [(
+            np.hypot(_x, _y) > system.soi_radius[_primary],
+            system.parent[_primary],
+        )]
+        # ... or entry into the SOI of one of its children
+        for _child in range(1, len(system)):
+            _orbiting = _primary == system.parent[_child]
+            if not np.any(_orbiting):
+                continue
+            _inside = np.hypot(
+                _x - _bx[_child][:, None], _y - _by[_child][:, None]
+            ) < system.soi_radius[_child]
+            _candidates.append((_inside & _orbiting, _child))
+
+        # keep the earliest crossing of each spacecraft
+        _index = np.full(len(_chunk), _num_times)
+        _target = np.full(len(_chunk), -1)
+        for _event, _body in _candidates:
+            _event &= _later
+            _k = np.where(_event.any(axis=0), _event.argmax(axis=0), _num_times)
+            _earlier = _k < _index
+            _index[_earlier] = _k[_earlier]
+            _target[_earlier] = np.broadcast_to(_body, _k.shape)[_earlier]
+        index[_chunk], target[_chunk] = _index, _target
+
+    return index, target
+
+
+def _refine_crossings(system, tracks, craft, primary, target, t_lo, t_hi):
+    """Vectorised bisection for the time of each SOI crossing.
+
+    Returns times just after each crossing, where the spacecraft is inside
+    the new primary's SOI.
+    """
+    _exit = target == system.parent[primary]
+    _child = np.where(_exit, primary, target)
+    _radius = system.soi_radius[_child]
+
+    def _crossed(t):
+        _x, _y = tracks.position(t, craft)
+        _cx, _cy = system.orbits.position(t, _child - 1)
+        return np.where(
+            _exit,
+            np.hypot(_x, _y) > _radius,
+            np.hypot(_x - _cx, _y - _cy) < _radius,
+        )
+
+    for _ in range(NUM_BISECTIONS):
+        _mid = 0.5 * (t_lo + t_hi)
+        _crossed_mid = _crossed(_mid)
+        t_lo = np.where(_crossed_mid, t_lo, _mid)
+        t_hi = np.where(_crossed_mid, _mid, t_hi)
+    return t_hi
+
+
+def _patch_states(system, tracks, craft, primary, target, time):
+    """Elements and sense of spacecraft relative to their new primaries."""
+    _x, _y = tracks.position(time, craft)
+    _vx, _vy = tracks.velocity(time, craft)
+
+    # shift by the state of the body whose SOI is crossed: add the old
+    # primary's state on exit, subtract the child's on entry
+    _exit = target == system.parent[primary]
+    _body = np.where(_exit, primary, target) - 1
+    _sign = np.where(_exit, 1., -1.)
+    _bx, _by = system.orbits.position(time, _body)
+    _bvx, _bvy = system.orbits.velocity(time, _body)
+    _x, _y = _x + _sign * _bx, _y + _sign * _by
+    _vx, _vy = _vx + _sign * _bvx, _vy + _sign * _bvy
+
+    # elements about each new primary
+    _elements = np.empty((4, len(craft)))
+    sense = np.empty(len(craft), dtype=int)
+    for _body in np.unique(target):
+        _rows = target == _body
+        _el, sense[_rows] = elements_from_state(
+            _x[_rows], _y[_rows], _vx[_rows], _vy[_rows], system.gm[_body]
+        )
+        _elements[:, _rows] = list(_el)
+    return OrbitalElements(*_elements), sense
+
+
+def propagate_patched_conics(system, primary, elements, times, sense=1,
+                             max_transitions=MAX_TRANSITIONS):
+    """Propagate spacecraft through SOI transitions over sorted times.
+
+    primary holds each spacecraft's initial primary body index, and
+    elements (an OrbitalElements of arrays) its orbit about that body with
+    the true anomaly at times[0]. Each pass screens all remaining samples
+    of the spacecraft still moving, so the number of passes is the largest
+    number of transitions made by any spacecraft.
+    """
+    times = np.asarray(times, dtype=float)
+    primary = np.asarray(primary)
+    _num = len(primary)
+
+    craft = np.arange(_num)
+    start = np.full(_num, times[0])
+    tracks = ConicTracks(elements, system.gm[primary], times[0], sense)
+    legs = [(craft, primary, start, tracks)]
+    _transitions = []
+
+    for _ in range(max_transitions):
+        _index, _target = _first_crossings(system, tracks, primary, start, times)
+        _found = _index < len(times)
+        if not np.any(_found):
+            break
+
+        # refine crossing times within the bracketing samples
+        _rows = np.flatnonzero(_found)
+        _index, _target = _index[_rows], _target[_rows]
+        _old = primary[_rows]
+        _time = _refine_crossings(
+            system, tracks, _rows, _old, _target,
+            np.maximum(times[_index - 1], start[_rows]), times[_index],
+        )
+        _elements, _sense = _patch_states(
+            system, tracks, _rows, _old, _target, _time
+        )
+        _transitions.append((
+            craft[_rows], _time, _old, _target,
+            np.array(list(_elements)), _sense,
+        ))
+
+        # continue only the spacecraft that changed primary
+        craft, primary, start = craft[_rows], _target, _time
+        tracks = ConicTracks(
+            _elements, system.gm[primary], start, _sense
+        )
+        legs.append((craft, primary, start, tracks))
+
+    # transitions in time order
+    _craft, _time, _old, _new, _elements, _sense = (
+        np.concatenate(_field, axis=-1) for _field in zip(
+            (np.empty(0, dtype=int), np.empty(0), np.empty(0, dtype=int),
+             np.empty(0, dtype=int), np.empty((4, 0)), np.empty(0, dtype=int)),
+            *_transitions,
+        )
+    )
+    _order = np.argsort(_time, kind='stable')
+    transitions = SOITransitions(
+        _craft[_order], _time[_order], _old[_order], _new[_order],
+        OrbitalElements(*_elements[:, _order]), _sense[_order],
+    )
+    return PatchedTrajectories(system, _num, legs, transitions)
@@ -0,0 +1,11 @@
+"""conftest.py
+
+Modules are imported flat from the orbit-demo directory, as when running
+`python orbit-demo`.
+
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,109 @@
+"""test_conic_artists.py
+
+Bezier paths of conic sections against the conic radius, across ellipses,
+parabolas and hyperbolas, including near-parabolic ones, and Kepler-timed
+orbit markers.
+
+"""
+
+import matplotlib
+matplotlib.use('Agg')
+
+import numpy as np
+import pytest
+from matplotlib.figure import Figure
+from matplotlib.path import Path
+
+from orbits import OrbitalElements
+from toolkit.conics import ConicSection, conic_radius
+from toolkit.kepler import mean_motion
+from visualisation.artists._conic_artists import conic_bezier_path
+from visualisation.artists._conic_artists import OrbitMarkerArtist
+from visualisation.artists._conic_artists import BEZIER_TOLERANCE
+
+ECCENTRICITIES = [
+    0, 0.5, 0.9, 0.99, 0.999, 1 - 1e-9, 1, 1 + 1e-9, 1.001, 1.002, 1.5, 10,
+]
+
+
+def bezier_points(path, num=101):
+    """Points along each cubic segment of path."""
+    _vertices = path.vertices[path.codes != Path.CLOSEPOLY]
+    _num = (len(_vertices) - 1) // 3
+    _control = np.stack([_vertices[_k:3 * _num + _k:3] for _k in range(4)])
+    _t = np.linspace(0, 1, num)[:, None, None]
+    _weights = [(1 - _t)**3, 3 * (1 - _t)**2 * _t, 3 * (1 - _t) * _t**2,
+                _t**3]
+    _points = sum(_w * _p for _w, _p in zip(_weights, _control))
+    return _points[..., 0].ravel(), _points[..., 1].ravel()
+
+
+@pytest.mark.parametrize('rmax', [None, 5, 50])
+@pytest.mark.parametrize('e', ECCENTRICITIES)
+def test_bezier_path_follows_the_conic(e, rmax):
+    conic = ConicSection(e, 1.2, 0.7)
+    path = conic_bezier_path(conic, rmax)
+    _x, _y = bezier_points(path)
+    _r = np.hypot(_x, _y)
+    _error = _r / conic.radius(np.arctan2(_y, _x)) - 1
+    assert np.max(np.abs(_error)) < BEZIER_TOLERANCE
+
+    if rmax is not None:
+        assert np.max(_r) < rmax * (1 + BEZIER_TOLERANCE)
+    # a clipped or open branch ends at its outermost points
+    if path.codes[-1] != Path.CLOSEPOLY:
+        _ends = np.hypot(*path.vertices[[0, -1]].T)
+        np.testing.assert_allclose(_ends, np.max(_r), rtol=1e-12)
+
+
+def test_bezier_path_is_empty_beyond_periapsis():
+    assert len(conic_bezier_path(ConicSection(1.5, 9.), 3).vertices) == 0
+
+
+def marker_positions(artist):
+    _angle, _r = artist.markers.get_data()
+    return np.array([_r * np.cos(_angle), _r * np.sin(_angle)])
+
+
+def swept_area(elements, start, end, num=20001):
+    """Area swept from true anomaly start forward to end."""
+    _f = start + np.linspace(0, (end - start) % (2 * np.pi), num)
+    _rsq = conic_radius(
+        _f, elements.eccentricity, elements.semilatus_rectum
+    ) ** 2
+    return 0.25 * np.sum(_rsq[1:] + _rsq[:-1]) * (_f[1] - _f[0])
+
+
+@pytest.mark.parametrize('elements', [
+    OrbitalElements(1.2, 0.6, 0.4, -2.), OrbitalElements(1.2, 1., 0.4, 1.),
+    OrbitalElements(1.2, 2.5, 0.4, 0.5),
+])
+def test_orbit_markers_follow_kepler_timing(elements):
+    _gm, _num, _t = 2.5, 4, 0.3
+    artist = OrbitMarkerArtist(
+        Figure().add_subplot(projection='polar'), elements, _gm, _num
+    )
+    _spacing = 2 * np.pi / (_num * mean_motion(
+        elements.eccentricity, elements.semilatus_rectum, _gm
+    ))
+    assert artist.spacing == pytest.approx(_spacing)
+
+    # equal areas in equal times: the first marker is the object at time
+    # t, and each of the others trails the one before by one spacing
+    artist.set_time(_t)
+    _anomaly = artist.markers.get_data()[0] - elements.periapsis_angle
+    _rate = 0.5 * np.sqrt(_gm * elements.semilatus_rectum)
+    _areas = [swept_area(elements, elements.true_anomaly, _anomaly[0])] + [
+        swept_area(elements, _start, _end)
+        for _start, _end in zip(_anomaly[1:], _anomaly[:-1])
+    ]
+    np.testing.assert_allclose(
+        _areas, _rate * np.r_[_t, np.full(_num - 1, _spacing)], rtol=1e-6
+    )
+
+    # one spacing later, each marker takes the place of the one before
+    _before = marker_positions(artist)
+    artist.set_time(_t + _spacing)
+    np.testing.assert_allclose(
+        marker_positions(artist)[:, 1:], _before[:, :-1], atol=1e-12
+    )
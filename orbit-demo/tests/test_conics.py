@@ -0,0 +1,90 @@
+"""test_conics.py
+
+Clipping of conic sections to a view radius, and arc-length spacing of
+the clipped locus.
+
+"""
+
+import numpy as np
+import pytest
+
+from toolkit.conics import ConicSection, conic_radius, conic_max_anomaly
+from toolkit.conics import conic_arc_length_anomaly
+
+
+@pytest.mark.parametrize('e, l, rmax', [
+    (0, 1.5, 1), (0.5, 1, 0.6), (1, 2, 0.9), (3, 4, 0.5),
+])
+def test_max_anomaly_is_none_beyond_periapsis(e, l, rmax):
+    assert conic_max_anomaly(e, l, rmax) is None
+
+
+@pytest.mark.parametrize('e, l, rmax, expected', [
+    (0, 1, 1, np.pi),
+    (0, 1, np.inf, np.pi),
+    (0.5, 1, 2, np.pi),
+    (0.5, 1, 3, np.pi),
+    (1, 1, np.inf, np.pi),
+    (2, 1, np.inf, np.arccos(-0.5)),
+])
+def test_max_anomaly_covers_the_whole_branch_within_rmax(e, l, rmax,
+                                                        expected):
+    assert conic_max_anomaly(e, l, rmax) == pytest.approx(expected)
+
+
+@pytest.mark.parametrize('e, l, rmax', [
+    (0.5, 1, 1.5), (0.99, 1, 5), (1, 1, 5), (1, 2, 1), (1.5, 1, 3),
+    (10, 2, 100),
+])
+def test_max_anomaly_meets_rmax_below_apoapsis(e, l, rmax):
+    _f = conic_max_anomaly(e, l, rmax)
+    assert 0 <= _f < (np.pi if e < 1 else np.arccos(-1 / e))
+    assert conic_radius(_f, e, l) == pytest.approx(rmax)
+
+
+@pytest.mark.parametrize('e', [0, 0.5, 0.99, 1, 2, 10])
+def test_arc_length_anomaly_is_even_in_arc_length(e):
+    _f = conic_arc_length_anomaly(e, 1, 0.9 * conic_max_anomaly(e, 1), 1000)
+    assert _f[0] == pytest.approx(-_f[-1])
+    assert np.all(np.diff(_f) > 0)
+
+    _x, _y = ConicSection(e).position(_f)
+    _ds = np.hypot(np.diff(_x), np.diff(_y))
+    np.testing.assert_allclose(_ds, np.mean(_ds), rtol=1e-3)
+
+
+@pytest.mark.parametrize('e, l, rmax', [
+    (0, 1, 2), (0.5, 1, 1.5), (0.5, 1, 10), (0.99, 1, 5), (1, 1, 5),
+    (1.5, 1, 3), (10, 2, 100),
+])
+def test_view_locus_lies_within_rmax(e, l, rmax):
+    conic = ConicSection(e, l, 0.4)
+    _clipped = e >= 1 or rmax < conic.apoapsis()
+    _r, _theta = conic.view_locus(rmax, 300, polar=True)
+    assert len(_r) == 301
+    assert np.all(_r <= rmax * (1 + 1e-12))
+    np.testing.assert_allclose(_r, conic.radius(_theta))
+
+    # clipped loci end at rmax, whole ellipses close at apoapsis
+    _end = rmax if _clipped else conic.apoapsis()
+    np.testing.assert_allclose(_r[[0, -1]], _end)
+    np.testing.assert_allclose(
+        np.min(_r), conic.periapsis(), rtol=1e-3
+    )
+
+    # vertices evenly spaced along the curve
+    _x, _y = conic.view_locus(rmax, 300)
+    _ds = np.hypot(np.diff(_x), np.diff(_y))
+    np.testing.assert_allclose(_ds, np.mean(_ds), rtol=1e-3)
+
+
+def test_view_locus_is_empty_beyond_periapsis():
+    _x, _y = ConicSection(0.5, 3).view_locus(1.5)
+    assert len(_x) == len(_y) == 0
+
+
+def test_view_locus_without_rmax_is_the_locus():
+    conic = ConicSection(0.5, 1, 0.4)
+    np.testing.assert_array_equal(
+        conic.view_locus(np.inf, 100), conic.locus(100)
+    )
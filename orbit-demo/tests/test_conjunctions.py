@@ -0,0 +1,95 @@
+"""test_conjunctions.py
+
+Screening stages against brute force.
+
+"""
+
+import numpy as np
+
+from orbits import OrbitalElements
+from conjunctions import conic_shells, shell_partners, shells_overlap
+from conjunctions import grid_pairs, screen_conjunctions, ConicTracks
+
+
+def random_elements(num, seed=0):
+    rng = np.random.default_rng(seed)
+    return OrbitalElements(
+        rng.uniform(0.8, 1.5, num), rng.uniform(0, 0.3, num),
+        rng.uniform(0, 2 * np.pi, num), rng.uniform(0, 2 * np.pi, num),
+    )
+
+
+def test_shell_partners_matches_brute_force():
+    rng = np.random.default_rng(1)
+    _rp, _ra = conic_shells(
+        rng.uniform(0, 1.2, 300), rng.uniform(0.5, 2, 300)
+    )
+    _i, _j = np.triu_indices(300, 1)
+    _overlap = shells_overlap(_rp, _ra, _i, _j, 0.01)
+    expected = (
+        np.bincount(_i[_overlap], minlength=300)
+        + np.bincount(_j[_overlap], minlength=300)
+    )
+    np.testing.assert_array_equal(shell_partners(_rp, _ra, 0.01), expected)
+
+
+def test_grid_pairs_with_query_matches_brute_force():
+    rng = np.random.default_rng(2)
+    x, y = rng.uniform(-1, 1, (2, 500))
+    query = rng.uniform(size=500) < 0.2
+    _i, _j = np.triu_indices(500, 1)
+    _close = np.hypot(x[_i] - x[_j], y[_i] - y[_j]) < 0.05
+    _involved = query[_i] | query[_j]
+    for _mask, _select in ((None, _close), (query, _close & _involved)):
+        expected = set(zip(_i[_select], _j[_select]))
+        found = list(zip(*grid_pairs(x, y, 0.05, _mask)))
+        assert len(found) == len(set(found))
+        assert set(found) == expected
+
+
+def test_screening_finds_all_sampled_approaches():
+    elements = random_elements(150)
+    times = np.linspace(0, 10, 200)
+    report = screen_conjunctions(elements, 1., times, 0.02)
+
+    # brute force on a much finer time grid
+    tracks = ConicTracks(elements, 1.)
+    _x, _y = tracks.position(np.linspace(0, 10, 8001)[:, None])
+    _i, _j = np.triu_indices(150, 1)
+    _closest = np.hypot(_x[:, _i] - _x[:, _j], _y[:, _i] - _y[:, _j]).min(0)
+    _close = _closest < 0.98 * 0.02
+    expected = set(zip(_i[_close], _j[_close]))
+    assert expected <= set(zip(report.first, report.second))
+
+
+def test_fast_outlier_does_not_inflate_grid_stage():
+    elements = random_elements(300)
+    times = np.linspace(0, 10, 100)
+    base = screen_conjunctions(elements, 1., times, 0.01)
+
+    # one fast, highly eccentric object
+    _outlier = OrbitalElements(*(
+        np.r_[_x, _y] for _x, _y in zip(elements, (0.1, 0.95, 0., 0.))
+    ))
+    report = screen_conjunctions(_outlier, 1., times, 0.01)
+    assert report.stages['grid'] <= base.stages['grid'] + 300
+
+
+def test_every_approach_of_a_co_orbital_pair_is_found():
+    # a pair that stays close for long stretches, with several approaches
+    # in each stretch
+    e = 0.01
+    elements = OrbitalElements(
+        np.r_[1., 1 - e * e], np.r_[0., e], np.r_[0., 0.], np.r_[0.3, 0.3]
+    )
+    report = screen_conjunctions(elements, 1., np.linspace(0, 30, 600), 0.015)
+
+    # brute force local minima on a much finer time grid
+    t = np.linspace(0, 30, 300001)
+    _x, _y = ConicTracks(elements, 1.).position(t[:, None])
+    _d = np.hypot(_x[:, 0] - _x[:, 1], _y[:, 0] - _y[:, 1])
+    _minimum = (_d[1:-1] < _d[:-2]) & (_d[1:-1] <= _d[2:]) & (_d[1:-1] < 0.015)
+    expected = t[1:-1][_minimum]
+
+    assert len(expected) == 10
+    np.testing.assert_allclose(np.sort(report.time), expected, atol=1e-3)
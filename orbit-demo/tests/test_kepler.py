@@ -0,0 +1,52 @@
+"""test_kepler.py
+
+Conversions between true and mean anomaly on every type of conic.
+
+"""
+
+import numpy as np
+import pytest
+
+from toolkit.kepler import mean_anomaly_from_true, true_anomaly_from_mean
+from toolkit.kepler import propagate_true_anomaly, mean_motion
+
+
+def true_anomalies(e, num=20001):
+    """True anomalies spanning the orbit, inside the asymptotes if e > 1."""
+    _limit = np.pi if e <= 1 else np.arccos(-1 / e)
+    return 0.999 * np.linspace(-_limit, _limit, num)[1:-1]
+
+
+def angle_difference(a, b):
+    return np.angle(np.exp(1j * (a - b)))
+
+
+@pytest.mark.parametrize('e', [0, 0.9, 0.99, 1, 1.5, 10])
+def test_true_mean_true_round_trip(e):
+    f = true_anomalies(e)
+    _M = mean_anomaly_from_true(f, e)
+    _f = true_anomaly_from_mean(_M, e)
+    np.testing.assert_allclose(angle_difference(_f, f), 0, atol=1e-11)
+
+
+@pytest.mark.parametrize('e', [1, 1.5, 10])
+def test_open_orbits_are_odd_in_mean_anomaly(e):
+    _M = np.r_[1e-20, 1e-3, 1., 1e3, 1e8, 1e300]
+    _f = true_anomaly_from_mean(_M, e)
+    assert np.all(np.isfinite(_f))
+    np.testing.assert_array_equal(true_anomaly_from_mean(-_M, e), -_f)
+
+
+def test_parabolic_inbound_leg_far_from_periapsis():
+    # large negative mean anomalies used to cancel catastrophically
+    f = np.r_[-3.1, -3.14, -3.141]
+    _f = true_anomaly_from_mean(mean_anomaly_from_true(f, 1.), 1.)
+    np.testing.assert_allclose(_f, f, rtol=1e-12)
+
+
+@pytest.mark.parametrize('e', [0, 0.5, 0.99])
+def test_propagating_one_period_returns_to_start(e):
+    f = true_anomalies(e, 101)
+    _period = 2 * np.pi / mean_motion(e, 1.3, 2.)
+    _f = propagate_true_anomaly(f, e, 1.3, 2., _period)
+    np.testing.assert_allclose(angle_difference(_f, f), 0, atol=1e-10)
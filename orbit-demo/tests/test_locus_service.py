@@ -0,0 +1,177 @@
+"""test_locus_service.py
+
+Request validation, frame limits and sequence numbers of the locus
+service, against a server on an ephemeral port computing in threads.
+
+"""
+
+import asyncio
+import json
+import struct
+
+import numpy as np
+import pytest
+
+from locus_protocol import parse_parameters, parse_message, decode_loci
+from locus_protocol import encode_frame, read_message, read_http_head
+from locus_protocol import MAX_MESSAGE_SIZE, OP_TEXT, OP_BINARY, OP_CLOSE
+from locus_protocol import CLOSE_TOO_BIG
+from locus_loadgen import open_websocket
+from locus_service import LocusServer, LocusCache
+
+
+@pytest.mark.parametrize('message', [
+    '[1, 2]', '"speed"', '{"speed": null}', '{"speed": "nan"}',
+    '{"speed": NaN}', '{"speed": Infinity}', '{"num_segment": 1e999}',
+    '{"speed": 1e400}', '{"speed": ' + '9' * 400 + '}', '{"seq": -1}',
+    '{"warp": 1}', '[' * 100000,
+])
+def test_invalid_messages_raise_value_error(message):
+    with pytest.raises(ValueError):
+        parse_message(message)
+
+
+def test_parse_parameters_converts_fields():
+    _params = parse_parameters({'speed' : '1.5', 'num_segment' : 20.7})
+    assert _params['speed'] == 1.5
+    assert _params['num_segment'] == 20
+    assert _params['seq'] == 0
+
+
+def serve(coroutine):
+    """Run coroutine(server) against a server on an ephemeral port."""
+    async def _run():
+        _server = LocusServer(port=0)
+        await _server.start()
+        _server.port = _server.server.sockets[0].getsockname()[1]
+        try:
+            return await coroutine(_server)
+        finally:
+            _server.server.close()
+            await _server.server.wait_closed()
+    return asyncio.run(_run())
+
+
+async def http_get(server, target, headers=''):
+    reader, writer = await asyncio.open_connection(server.host, server.port)
+    writer.write(
+        f"GET {target} HTTP/1.1\r\nConnection: close\r\n{headers}\r\n"
+        .encode('latin-1')
+    )
+    _status, _headers = await read_http_head(reader)
+    _body = await reader.readexactly(int(_headers['content-length']))
+    writer.close()
+    return _status, _body
+
+
+@pytest.mark.parametrize('target, headers', [
+    ('/locus?speed=inf', ''),
+    ('/locus?speed=nan', ''),
+    ('/locus?num_segment=1e999', ''),
+    ('/locus?warp=1', ''),
+    ('/locus?speed=0', ''),
+    ('/locus?speed=-3', ''),
+    ('/locus?angle=90', ''),
+    ('/locus?angle=-90', ''),
+    ('/locus?impulse_speed=-0.1', ''),
+    ('/locus?speed=1&impulse_speed=1&impulse_angle=180', ''),
+    ('/ws', 'Upgrade: websocket\r\n'),
+])
+def test_bad_http_requests_get_400(target, headers):
+    _status, _ = serve(lambda server: http_get(server, target, headers))
+    assert ' 400 ' in _status
+
+
+def test_http_locus():
+    _status, _body = serve(lambda server: http_get(
+        server, '/locus?speed=1&impulse_speed=0.3&seq=7'
+    ))
+    assert ' 200 ' in _status
+    _seq, _scalars, _old, _new = decode_loci(_body)
+    assert _seq == 7
+    assert np.all(np.isfinite(_scalars))
+
+
+def test_websocket_survives_invalid_messages():
+    async def _session(server):
+        reader, writer = await open_websocket(server.host, server.port)
+        _replies = []
+        for _message in (
+                '{"speed": "nan"}', '[1, 2]', '{"angle": 90}',
+                '{"impulse_speed": 1, "impulse_angle": 180}', '{"seq": 5}'):
+            writer.write(encode_frame(OP_TEXT, _message.encode(), True))
+            _replies.append(await read_message(reader, writer))
+        writer.close()
+        return _replies, len(server.cache.payloads)
+
+    _replies, _cached = serve(_session)
+    _opcodes = [_opcode for _opcode, _ in _replies]
+    assert _opcodes == [OP_TEXT] * 4 + [OP_BINARY]
+    assert decode_loci(_replies[-1][1])[0] == 5
+    # the state with no finite orbit is not cached
+    assert _cached == 1
+
+
+def test_websocket_closes_on_oversized_frame():
+    async def _session(server):
+        reader, writer = await open_websocket(server.host, server.port)
+        # only the header of a frame claiming 2**63 bytes
+        writer.write(bytes([0x80 | OP_TEXT, 0x80 | 127])
+                     + struct.pack('>Q', 1 << 63) + b'mask')
+        _reply = await read_message(reader, writer)
+        writer.close()
+        return _reply
+
+    _opcode, _payload = serve(_session)
+    assert _opcode == OP_CLOSE
+    assert struct.unpack('>H', _payload[:2])[0] == CLOSE_TOO_BIG
+
+
+def test_websocket_closes_on_oversized_message():
+    async def _session(server):
+        reader, writer = await open_websocket(server.host, server.port)
+        # fragments each under the limit, together over it
+        _part = b' ' * (MAX_MESSAGE_SIZE // 2 + 1)
+        _first = encode_frame(OP_TEXT, _part, True)
+        _rest = encode_frame(0x0, _part, True)
+        writer.write(bytes([_first[0] & 0x7F]) + _first[1:] + _rest)
+        _reply = await read_message(reader, writer)
+        writer.close()
+        return _reply
+
+    _opcode, _payload = serve(_session)
+    assert _opcode == OP_CLOSE
+    assert struct.unpack('>H', _payload[:2])[0] == CLOSE_TOO_BIG
+
+
+def test_stats_count_requests():
+    async def _session(server):
+        reader, writer = await open_websocket(server.host, server.port)
+        writer.write(encode_frame(OP_TEXT, json.dumps({'seq' : 1}).encode(),
+                                  True))
+        await read_message(reader, writer)
+        writer.close()
+        return await http_get(server, '/stats')
+
+    _status, _body = serve(_session)
+    _stats = json.loads(_body)
+    assert _stats['requests'] == 1
+    assert _stats['sent'] == 1
+    assert _stats['cache_misses'] == 1
+
+
+def test_cache_batches_misses_and_shares_pending_states():
+    async def _gets():
+        _cache = LocusCache()
+        _params = [
+            parse_parameters({'impulse_speed' : 0.1 * (_i % 5), 'seq' : _i})
+            for _i in range(20)
+        ]
+        _payloads = await asyncio.gather(*map(_cache.get, _params))
+        return _cache, _payloads
+
+    _cache, _payloads = asyncio.run(_gets())
+    assert (_cache.misses, _cache.hits) == (5, 0)
+    assert len(_cache.payloads) == 5 and not _cache.pending
+    assert [decode_loci(_p)[0] for _p in _payloads] == list(range(20))
+    assert _payloads[0][8:] == _payloads[5][8:]
@@ -0,0 +1,75 @@
+"""test_orbits_propagation.py
+
+Kepler propagation of orbital elements: periodicity of ellipses,
+reversibility, and agreement with the velocity of the orbital state.
+
+"""
+
+import numpy as np
+import pytest
+
+from orbits import OrbitalElements, propagate_elements, flight_heading
+from orbits_toolkit import orbital_state_from_elements
+from toolkit.kepler import mean_motion
+
+GM = 2.5
+
+
+def random_elements(num, eccentricity, seed=0):
+    """Elements with true anomalies inside any asymptotes."""
+    rng = np.random.default_rng(seed)
+    _e = rng.uniform(*eccentricity, num)
+    _limit = np.where(_e < 1, np.pi, np.arccos(-1 / np.maximum(_e, 1)))
+    return OrbitalElements(
+        rng.uniform(0.5, 2, num), _e, rng.uniform(0, 2 * np.pi, num),
+        0.9 * _limit * rng.uniform(-1, 1, num),
+    )
+
+
+def cartesian_state(elements, gm=GM):
+    """Position and velocity components, shape (4, N)."""
+    _r, _theta, _v, _gamma = orbital_state_from_elements(*elements, gm)
+    _heading = flight_heading(_theta, _gamma)
+    return np.array([
+        _r * np.cos(_theta), _r * np.sin(_theta),
+        _v * np.cos(_heading), _v * np.sin(_heading),
+    ])
+
+
+def test_one_period_returns_an_ellipse_to_its_start():
+    elements = random_elements(200, (0, 0.95))
+    _period = 2 * np.pi / mean_motion(
+        elements.eccentricity, elements.semilatus_rectum, GM
+    )
+    _after = propagate_elements(elements, GM, _period)
+    for _name in ('semilatus_rectum', 'eccentricity', 'periapsis_angle'):
+        assert getattr(_after, _name) is getattr(elements, _name)
+    np.testing.assert_allclose(
+        cartesian_state(_after), cartesian_state(elements), atol=1e-9
+    )
+
+
+@pytest.mark.parametrize('eccentricity', [(1, 1), (1.01, 5)])
+@pytest.mark.parametrize('dt', [0.3, -2, 10])
+def test_open_orbit_propagation_is_reversible(eccentricity, dt):
+    elements = random_elements(200, eccentricity)
+    _there = propagate_elements(elements, GM, dt)
+    _back = propagate_elements(_there, GM, -dt)
+    assert not np.allclose(_there.true_anomaly, elements.true_anomaly)
+    # true anomaly near the asymptotes limits precision on the way back
+    np.testing.assert_allclose(
+        cartesian_state(_back), cartesian_state(elements), atol=1e-9
+    )
+
+
+def test_propagation_follows_the_velocity():
+    elements = random_elements(300, (0, 3))
+    _step = 1e-6
+    _before, _after = (
+        cartesian_state(propagate_elements(elements, GM, _dt))
+        for _dt in (-_step, _step)
+    )
+    np.testing.assert_allclose(
+        (_after[:2] - _before[:2]) / (2 * _step),
+        cartesian_state(elements)[2:], rtol=1e-6, atol=1e-8,
+    )
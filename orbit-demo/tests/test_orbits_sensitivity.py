@@ -0,0 +1,99 @@
+"""test_orbits_sensitivity.py
+
+Analytic Jacobians against central finite differences.
+
+"""
+
+import warnings
+
+import numpy as np
+
+from orbits import OrbitalState
+from orbits_toolkit import orbital_elements_from_state
+from orbits_toolkit import orbital_state_from_elements
+from orbits_sensitivity import orbital_elements_jacobian
+from orbits_sensitivity import orbital_state_jacobian
+from orbits_sensitivity import impulse_jacobian
+from impulses import calculate_impulse
+
+STEP = 1e-6
+TOLERANCE = 1e-5
+
+
+def _wrap(angle):
+    return (angle + np.pi) % (2 * np.pi) - np.pi
+
+def finite_difference_jacobian(function, inputs, angular_outputs=()):
+    """Central-difference Jacobian of function, shape (N, m, n)."""
+    _columns = []
+    for j in range(len(inputs)):
+        _plus = [np.array(x, dtype=float) for x in inputs]
+        _minus = [np.array(x, dtype=float) for x in inputs]
+        _plus[j] += STEP
+        _minus[j] -= STEP
+        _diff = np.array(function(*_plus)) - np.array(function(*_minus))
+        for i in angular_outputs:
+            _diff[i] = _wrap(_diff[i])
+        _columns.append(_diff / (2 * STEP))
+    return np.stack(_columns, axis=-1).transpose(1, 0, 2)
+
+
+def test_orbital_elements_jacobian():
+    rng = np.random.default_rng(0)
+    _state = (
+        rng.uniform(0.5, 2, 500), rng.uniform(0.5, 5, 500),
+        rng.uniform(0.3, 1.3, 500), rng.uniform(-1, 1, 500),
+    )
+    _elements, jacobian = orbital_elements_jacobian(*_state, 1.5)
+    np.testing.assert_allclose(
+        _elements, orbital_elements_from_state(*_state, 1.5)
+    )
+    expected = finite_difference_jacobian(
+        lambda *x: orbital_elements_from_state(*x, 1.5), _state, (2, 3)
+    )
+    np.testing.assert_allclose(jacobian, expected, atol=TOLERANCE)
+
+
+def test_orbital_state_jacobian():
+    rng = np.random.default_rng(1)
+    _elements = (
+        rng.uniform(0.5, 2, 500), rng.uniform(0.1, 1.5, 500),
+        rng.uniform(0, 6, 500), rng.uniform(-1.5, 1.5, 500),
+    )
+    _state, jacobian = orbital_state_jacobian(*_elements, 1.5)
+    np.testing.assert_allclose(
+        _state, orbital_state_from_elements(*_elements, 1.5)
+    )
+    expected = finite_difference_jacobian(
+        lambda *x: orbital_state_from_elements(*x, 1.5), _elements, (1, 3)
+    )
+    np.testing.assert_allclose(jacobian, expected, atol=TOLERANCE)
+
+
+def test_impulse_jacobian():
+    rng = np.random.default_rng(2)
+    _inputs = (
+        rng.uniform(0, 1, 500), rng.uniform(-3, 3, 500),
+        rng.uniform(0, 6, 500),
+    )
+    _, jacobian = impulse_jacobian(*_inputs)
+    expected = finite_difference_jacobian(
+        lambda *x: impulse_jacobian(*x)[0], _inputs
+    )
+    np.testing.assert_allclose(jacobian, expected, atol=TOLERANCE)
+
+
+def test_impulse_jacobian_matches_calculate_impulse():
+    _state = OrbitalState.from_state_components(1, 0.3, 1.1, 0.2)
+    _impulse, _ = impulse_jacobian(0.4, 0.7, _state.flight_heading)
+    np.testing.assert_allclose(
+        _impulse, list(calculate_impulse(_state, 0.4, 0.7))
+    )
+
+
+def test_circular_orbit_jacobian_is_nan_without_warnings():
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        _, jacobian = orbital_elements_jacobian(1., 0., 1., 0., 1.)
+    assert np.all(np.isfinite(jacobian[0]))
+    assert np.all(np.isnan(jacobian[1:, [0, 2, 3]]))
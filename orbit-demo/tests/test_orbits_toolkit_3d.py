@@ -0,0 +1,77 @@
+"""test_orbits_toolkit_3d.py
+
+3D conversions and impulses, and their agreement with the planar tools.
+
+"""
+
+import numpy as np
+import pytest
+
+from orbits import OrbitalElements, OrbitalState
+from orbits_toolkit import orbital_elements_from_state
+from orbits_toolkit_3d import orbital_elements_from_state_3d
+from orbits_toolkit_3d import orbital_state_from_elements_3d
+from orbits_toolkit_3d import calculate_impulse_3d
+from impulses import calculate_impulse
+from toolkit.vector import Vector2D
+
+
+def _wrap(angle):
+    return (angle + np.pi) % (2 * np.pi) - np.pi
+
+
+def test_state_round_trip():
+    rng = np.random.default_rng(5)
+    _elements = [
+        rng.uniform(0.5, 2, 1000), rng.uniform(0, 3, 1000),
+        rng.uniform(0, np.pi, 1000), rng.uniform(0, 2 * np.pi, 1000),
+        rng.uniform(0, 2 * np.pi, 1000), rng.uniform(-1.5, 1.5, 1000),
+    ]
+    # circular and equatorial edge cases
+    _elements[1][:10] = 0
+    _elements[2][10:20] = 0
+    _elements[2][20:30] = np.pi
+
+    position, velocity = orbital_state_from_elements_3d(*_elements, 1.)
+    _round_trip = orbital_state_from_elements_3d(
+        *orbital_elements_from_state_3d(position, velocity, 1.), 1.
+    )
+    np.testing.assert_allclose(_round_trip[0], position, atol=1e-9)
+    np.testing.assert_allclose(_round_trip[1], velocity, atol=1e-9)
+
+
+def test_planar_elements_match_2d():
+    rng = np.random.default_rng(6)
+    _state = (
+        rng.uniform(0.5, 2, 1000), rng.uniform(0, 2 * np.pi, 1000),
+        rng.uniform(0.3, 1.3, 1000), rng.uniform(-1, 1, 1000),
+    )
+    _radius, _angle, _speed, _flight = _state
+    _heading = _angle + 0.5 * np.pi - _flight
+    _zero = np.zeros(1000)
+    position = np.stack([*Vector2D.from_polar(_radius, _angle), _zero], -1)
+    velocity = np.stack([*Vector2D.from_polar(_speed, _heading), _zero], -1)
+
+    expected = orbital_elements_from_state(*_state, 1.)
+    found = OrbitalElements.from_state_3d(position, velocity, 1.)
+    for _x, _y in zip(expected, found):
+        np.testing.assert_allclose(_wrap(np.asarray(_x) - _y), 0, atol=1e-9)
+
+
+@pytest.mark.parametrize('flight_angle', [0.3, np.pi - 0.3])
+def test_planar_impulse_matches_2d(flight_angle):
+    # flight angles beyond pi / 2 give clockwise (retrograde) motion
+    _state = OrbitalState.from_state_components(1.2, 0.4, 1.1, flight_angle)
+    position = [[*_state.position, 0]]
+    velocity = [[*_state.velocity, 0]]
+    for _angle in np.linspace(-np.pi, np.pi, 9):
+        expected = list(calculate_impulse(_state, 0.3, _angle)) + [0]
+        found = calculate_impulse_3d(position, velocity, 0.3, _angle)
+        np.testing.assert_allclose(found[0], expected, atol=1e-12)
+
+
+def test_elevation_tilts_towards_positive_z():
+    _impulse = calculate_impulse_3d(
+        [[1, 0, 0], [1, 0, 0]], [[0, 1, 0], [0, -1, 0]], 1., 0., 0.5 * np.pi
+    )
+    np.testing.assert_allclose(_impulse, [[0, 0, 1], [0, 0, 1]], atol=1e-12)
@@ -0,0 +1,143 @@
+"""test_patched_conics.py
+
+Patched-conic propagation through an Earth-Moon system: continuity of
+the inertial state across SOI crossings, and the crossing search.
+
+"""
+
+import numpy as np
+import pytest
+
+import patched_conics
+from orbits import OrbitalElements
+from conjunctions import ConicTracks
+from patched_conics import Body, PatchedConicSystem, propagate_patched_conics
+from patched_conics import _first_crossings, _refine_crossings
+
+TIMES = np.linspace(0, 20, 2001)
+
+
+def earth_moon():
+    _earth = Body('earth', 1.)
+    _moon = Body('moon', 0.0123, _earth, OrbitalElements(1., 0., 0., 0.))
+    return PatchedConicSystem([_earth, _moon])
+
+
+def crossing_orbits(num, seed=0, apoapsis=(1., 1.4)):
+    """Orbits about the Earth whose apoapses reach beyond the Moon's.
+
+    Spacecraft start near periapsis, well inside the Moon's orbit.
+    """
+    rng = np.random.default_rng(seed)
+    _rp, _ra = rng.uniform(0.2, 0.5, num), rng.uniform(*apoapsis, num)
+    _e = (_ra - _rp) / (_ra + _rp)
+    return OrbitalElements(
+        _rp * (1 + _e), _e,
+        rng.uniform(0, 2 * np.pi, num), rng.uniform(-1, 1, num),
+    )
+
+
+def propagate(sense, num=60, elements=None):
+    if elements is None:
+        elements = crossing_orbits(num)
+    return propagate_patched_conics(
+        earth_moon(), np.zeros(num, dtype=int), elements, TIMES, sense,
+    )
+
+
+def inertial_state(trajectories, craft, t):
+    """Inertial position and (finite difference) velocity of each craft.
+
+    Returns the states just before and just after times t, each taken
+    from the leg in force on that side.
+    """
+    def _state(step):
+        _t = t + step * np.array([1., 3.])[:, None]
+        _x, _y = trajectories.positions(_t.ravel())
+        _x = _x.reshape(2, len(t), -1)[:, np.arange(len(t)), craft]
+        _y = _y.reshape(2, len(t), -1)[:, np.arange(len(t)), craft]
+        _position = np.array([_x[0], _y[0]])
+        _velocity = np.array([_x[1] - _x[0], _y[1] - _y[0]]) / (2 * step)
+        return _position, _velocity
+    return _state(-1e-6), _state(1e-6)
+
+
+@pytest.mark.parametrize('sense', [1, -1])
+def test_inertial_state_is_continuous_across_crossings(sense):
+    trajectories = propagate(sense)
+    transitions = trajectories.transitions
+    assert np.any(transitions.new_primary == 1)
+    assert np.any(transitions.old_primary == 1)
+
+    (_p0, _v0), (_p1, _v1) = inertial_state(
+        trajectories, transitions.craft, transitions.time
+    )
+    np.testing.assert_allclose(_p1, _p0, atol=1e-5)
+    np.testing.assert_allclose(_v1, _v0, atol=1e-4)
+
+
+def test_retrograde_flyby():
+    trajectories = propagate(-1)
+    transitions = trajectories.transitions
+    _exits = transitions.new_primary == 0
+    assert np.any(transitions.new_primary == 1) and np.any(_exits)
+
+    # before any crossing, every spacecraft moves clockwise
+    _x, _y = trajectories.positions(TIMES[:2])
+    assert np.all(_x[0] * _y[1] - _y[0] * _x[1] < 0)
+
+    # after leaving the Moon, the sense of each orbit about the Earth is
+    # that of its inertial motion
+    (_p, _v), _ = inertial_state(
+        trajectories, transitions.craft[_exits],
+        transitions.time[_exits] + 4e-6,
+    )
+    _h = _p[0] * _v[1] - _p[1] * _v[0]
+    np.testing.assert_array_equal(transitions.sense[_exits], np.sign(_h))
+
+
+def test_shell_filter_gives_the_same_transitions(monkeypatch):
+    # half the spacecraft can reach the Moon's SOI, half cannot
+    elements = OrbitalElements(*(
+        np.r_[_a, _b] for _a, _b in zip(
+            crossing_orbits(60), crossing_orbits(60, 1, (0.55, 0.8))
+        )
+    ))
+    filtered = propagate(1, 120, elements).transitions
+
+    # shells reaching everywhere: every spacecraft is screened
+    def _everywhere(e, l):
+        _shape = np.shape(e)
+        return np.zeros(_shape), np.full(_shape, np.inf)
+    monkeypatch.setattr(patched_conics, 'conic_shells', _everywhere)
+    screened = propagate(1, 120, elements).transitions
+
+    np.testing.assert_array_equal(filtered.craft, screened.craft)
+    np.testing.assert_array_equal(filtered.new_primary, screened.new_primary)
+    np.testing.assert_allclose(filtered.time, screened.time)
+
+
+def test_refined_crossings_lie_inside_the_new_primary_soi():
+    system = earth_moon()
+    _num = 60
+    primary = np.zeros(_num, dtype=int)
+    tracks = ConicTracks(crossing_orbits(_num), 1., TIMES[0])
+    start = np.full(_num, TIMES[0])
+    index, target = _first_crossings(system, tracks, primary, start, TIMES)
+    craft = np.flatnonzero(index < len(TIMES))
+    assert len(craft)
+
+    _lo, _hi = TIMES[index[craft] - 1], TIMES[index[craft]]
+    time = _refine_crossings(
+        system, tracks, craft, primary[craft], target[craft], _lo, _hi
+    )
+    assert np.all((_lo < time) & (time <= _hi))
+
+    # just inside the Moon's SOI at the refined time, outside just before
+    _radius = system.soi_radius[target[craft]]
+    for _t, _inside in ((time, True), (time - 1e-9, False)):
+        _x, _y = tracks.position(_t, craft)
+        _mx, _my = system.orbits.position(_t, target[craft] - 1)
+        _distance = np.hypot(_x - _mx, _y - _my)
+        assert np.all((_distance < _radius) == _inside)
+        np.testing.assert_allclose(_distance, _radius, atol=1e-8)
@@ -0,0 +1,192 @@
+"""test_session.py
+
+Recording an OrbitImpulseUI session on an Agg canvas, replaying it, and
+the latency report.
+
+"""
+
+import matplotlib
+matplotlib.use('Agg')
+
+import numpy as np
+import pytest
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.backend_bases import MouseEvent
+
+from visualisation import OrbitImpulseUI
+from visualisation.session import SessionRecorder, ReplayCanvas, ReplayReport
+from visualisation.session import read_session, replay_events, replay_session
+
+SLIDERS = ['speed_slider', 'angle_slider', 'impulse_speed_slider',
+           'impulse_angle_slider', 'warp_slider']
+
+
+def make_ui(canvas_class, header=None):
+    header = header or {'initial_speed' : 1., 'initial_angle' : 0.,
+                        'speed_scale' : 1, 'render_mode' : 'path',
+                        'figsize' : [8, 4], 'dpi' : 40}
+    _figure = Figure(header['figsize'], dpi=header['dpi'])
+    canvas_class(_figure)
+    ui = OrbitImpulseUI(
+        _figure, header['initial_speed'], header['initial_angle'],
+        header['speed_scale'], render_mode=header['render_mode'],
+    )
+    _figure.canvas.draw()
+    return ui
+
+
+def click(ui, name):
+    """Press and release the mouse over a button."""
+    _canvas = ui.figure.canvas
+    _x, _y = ui.widgets[name].ax.transAxes.transform((0.5, 0.5))
+    for _name in ('button_press_event', 'button_release_event'):
+        _canvas.callbacks.process(
+            _name, MouseEvent(_name, _canvas, _x, _y, 1)
+        )
+
+
+def drag(ui, name, values):
+    """Drag a slider through values, then release the mouse."""
+    _slider = ui.widgets[name]
+    _slider.drag_active = True
+    for _value in values:
+        _slider.set_val(_value)
+    _slider.drag_active = False
+    _canvas = ui.figure.canvas
+    _canvas.callbacks.process(
+        'button_release_event',
+        MouseEvent('button_release_event', _canvas, 0, 0, 1),
+    )
+
+
+def tick(ui):
+    """Fire the playback timer's callbacks once."""
+    for _func, _args, _kwargs in ui.timer.callbacks:
+        _func(*_args, **_kwargs)
+
+
+def ui_state(ui):
+    return {
+        'values' : [ui.widgets[_name].val for _name in SLIDERS],
+        'playing' : ui.playing,
+        'playback_time' : ui.playback_time,
+        'elements' : [np.array(tuple(ui.elements[_orbit]))
+                      for _orbit in ('old_orbit', 'new_orbit')],
+        'markers' : [np.array(ui.artists[f'{_orbit}_markers'].markers
+                              .get_data())
+                     for _orbit in ('old_orbit', 'new_orbit')],
+    }
+
+
+@pytest.fixture
+def session(tmp_path):
+    """A recorded session and the state of the UI at its end."""
+    _path = tmp_path / 'session.jsonl'
+    ui = make_ui(FigureCanvasAgg)
+    recorder = SessionRecorder(ui, _path)
+
+    drag(ui, 'speed_slider', [1.1, 1.2, 1.25])
+    ui.widgets['impulse_speed_slider'].set_val(0.3)
+    click(ui, 'reset_button')
+    ui.widgets['impulse_angle_slider'].set_val(40)
+    ui.widgets['warp_slider'].set_val(2.5)
+    click(ui, 'play_button')
+    for _ in range(3):
+        tick(ui)
+    click(ui, 'play_button')
+    click(ui, 'play_button')
+    tick(ui)
+
+    recorder.close()
+    return _path, ui_state(ui)
+
+
+def test_session_records_every_widget(session):
+    _path, _state = session
+    header, events = read_session(_path)
+    assert header['type'] == 'session' and header['render_mode'] == 'path'
+    assert [_event['type'] for _event in events] == (
+        ['slider'] * 3 + ['release', 'slider', 'reset', 'release']
+        + ['slider', 'slider', 'play', 'release'] + ['frame'] * 3
+        + ['play', 'release', 'play', 'release', 'frame']
+    )
+    _sliders = [_event for _event in events if _event['type'] == 'slider']
+    assert [_event['name'] for _event in _sliders] == (
+        ['speed_slider'] * 3
+        + ['impulse_speed_slider', 'impulse_angle_slider', 'warp_slider']
+    )
+    assert [_event['dragging'] for _event in _sliders] == (
+        [True] * 3 + [False] * 3
+    )
+    _times = [_event['time'] for _event in events]
+    assert _times == sorted(_times)
+    assert _state['playing'] and _state['playback_time'] > 0
+
+
+def test_reset_restores_the_orbit_sliders_only(session):
+    _path, _ = session
+    ui = make_ui(ReplayCanvas, read_session(_path)[0])
+    _initial = ui_state(ui)
+    _, events = read_session(_path)
+
+    # the reset event, replayed after the sliders it resets
+    _reset = [_event['type'] for _event in events].index('reset')
+    ui.widgets['warp_slider'].set_val(3.)
+    replay_events(ui, events[:_reset + 1])
+    _state = ui_state(ui)
+    assert _state['values'][:4] == _initial['values'][:4]
+    assert _state['values'][4] == 3.
+    for _key in ('elements', 'markers'):
+        for _actual, _expected in zip(_state[_key], _initial[_key]):
+            np.testing.assert_allclose(_actual, _expected)
+
+
+def test_replay_reproduces_the_session(session):
+    _path, _recorded = session
+    header, events = read_session(_path)
+    ui = make_ui(ReplayCanvas, header)
+    _types, _compute, _draw = replay_events(ui, events)
+    assert _types == [_event['type'] for _event in events]
+    assert len(_compute) == len(_draw) == len(events)
+
+    _replayed = ui_state(ui)
+    assert _replayed['values'] == _recorded['values']
+    assert _replayed['playing'] == _recorded['playing']
+    assert _replayed['playback_time'] == _recorded['playback_time']
+    for _key in ('elements', 'markers'):
+        for _actual, _expected in zip(_replayed[_key], _recorded[_key]):
+            np.testing.assert_allclose(_actual, _expected)
+
+
+def test_replay_session_reports_every_event(session):
+    _path, _ = session
+    report = replay_session(_path, render_mode='locus')
+    assert report.render_mode == 'locus'
+    assert len(report) == len(read_session(_path)[1])
+    assert np.all(report.compute >= 0) and np.all(report.draw >= 0)
+    # slider events redraw the canvas, playback frames are blitted
+    _draw = report.draw[report.event_types == 'slider']
+    assert np.min(_draw) > np.max(report.draw[report.event_types == 'frame'])
+    assert 'events: 19' in report.summary()
+
+
+def test_report_percentiles():
+    report = ReplayReport(
+        'path', ['slider'] * 101, np.linspace(0, 0.1, 101),
+        np.full(101, 0.002),
+    )
+    _percentiles = report.percentiles((0, 50, 100))
+    assert _percentiles == {
+        'compute' : pytest.approx({0 : 0, 50 : 50, 100 : 100}),
+        'draw' : pytest.approx({0 : 2, 50 : 2, 100 : 2}),
+        'total' : pytest.approx({0 : 2, 50 : 52, 100 : 102}),
+    }
+
+    _lines = report.summary().splitlines()
+    assert _lines[0] == 'render mode: path, events: 101'
+    assert _lines[1].split() == ['ms', 'p50', 'p90', 'p99']
+    assert [_line.split()[0] for _line in _lines[2:]] == (
+        ['compute', 'draw', 'total']
+    )
+    assert repr(report) == "ReplayReport('path', 101 events)"
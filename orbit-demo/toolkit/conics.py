@@ -12,6 +12,9 @@ from toolkit import angle_add, angle_sub
 PI = np.pi
 TWO_PI = 2 * PI
 
+# samples used to tabulate arc length along a conic
+ARC_SAMPLES = 512
+
 
 def conic_radius(angle, e, l=1):
     """Radius of conic section at true anomaly angle."""
@@ -26,6 +29,69 @@ def conic_periapsis(e, l):
 def conic_apoapsis(e, l):
     return l / (1 - e)
 
+def get_conic_scale(conic):
+    """Determine characteristic length scale for conic."""
+    e, l = conic.e, conic.l
+    a = conic_semimajor_axis(e, l)
+    return 2 * (a if e < 1 else abs(a) * e)
+
+def conic_max_anomaly(e, l, rmax=np.inf):
+    """Largest true anomaly on the principal branch with radius <= rmax.
+
+    Radius increases with |true anomaly|, so the visible part of the
+    branch is the single arc [-f, f]. Returns None if the periapsis lies
+    beyond rmax.
+    """
+    _limit = PI if e < 1 else np.arccos(-1./e)
+    if conic_periapsis(e, l) > rmax:
+        return None
+    if e == 0 or not np.isfinite(rmax):
+        return _limit
+
+    # solve l / (1 + e cos f) = rmax
+    _cos = (l / rmax - 1) / e
+    return _limit if _cos <= -1 else min(np.arccos(_cos), _limit)
+
+def conic_arc_length_anomaly(e, l, max_anomaly, num_segment):
+    """True anomalies on [-max_anomaly, max_anomaly], even in arc length.
+
+    Arc length is tabulated against the eccentric (parabolic, hyperbolic)
+    anomaly u, in which the speed along the conic stays smooth out to the
+    asymptotes, and inverted by cubic Hermite interpolation.
+    """
+    # u = 2 arctan(k tan(f / 2)), tan(f / 2) or 2 arctanh(k tan(f / 2)),
+    # with speed ds/du from x = a (cos E - e), y = b sin E and the like
+    _tan = np.tan(0.5 * max_anomaly)
+    if e < 1:
+        _k = np.sqrt((1 - e) / (1 + e))
+        _u = np.linspace(-1, 1, ARC_SAMPLES + 1) * 2 * np.arctan(_k * _tan)
+        _ds = l / (1 - e * e) * np.sqrt(1 - e * e + (e * np.sin(_u))**2)
+    elif e == 1:
+        _u = np.linspace(-1, 1, ARC_SAMPLES + 1) * _tan
+        _ds = l * np.hypot(1, _u)
+    else:
+        _k = np.sqrt((e - 1) / (e + 1))
+        _u = np.linspace(-1, 1, ARC_SAMPLES + 1) * 2 * np.arctanh(_k * _tan)
+        _ds = l / (e * e - 1) * np.sqrt(e * e - 1 + (e * np.sinh(_u))**2)
+    _s = np.concatenate([[0], np.cumsum(0.5 * (_ds[1:] + _ds[:-1]))])
+    _s *= _u[1] - _u[0]
+
+    # invert s(u) within each table interval, with du/ds = 1 / speed
+    _target = np.linspace(0, _s[-1], num_segment + 1)
+    _i = np.clip(np.searchsorted(_s, _target, 'right') - 1, 0, ARC_SAMPLES - 1)
+    _h = _s[_i + 1] - _s[_i]
+    _t = (_target - _s[_i]) / np.where(_h > 0, _h, 1)
+    _u = (
+        (1 + 2 * _t) * (1 - _t)**2 * _u[_i] + _t * (1 - _t)**2 * _h / _ds[_i]
+        + _t * _t * (3 - 2 * _t) * _u[_i + 1]
+        - _t * _t * (1 - _t) * _h / _ds[_i + 1]
+    )
+
+    if e < 1:
+        return 2 * np.arctan(np.tan(0.5 * _u) / _k)
+    if e == 1:
+        return 2 * np.arctan(_u)
+    return 2 * np.arctan(np.tanh(0.5 * _u) / _k)
 
 class ConicSection:
     """A simple conic section."""
@@ -70,4 +136,29 @@ class ConicSection:
     
             # rotate from apside-centred frame to reference frame 
             return rotate_2d(_x, _y, -self.angle0)
+
+    def view_locus(self, rmax, num_segment=3000, polar=False):
+        """Points on the principal branch within radius rmax.
+
+        Points are spaced evenly in arc length, so every vertex lands on
+        the visible part of the curve.
+        """
+        if not np.isfinite(rmax):
+            return self.locus(num_segment, polar)
+        _max = conic_max_anomaly(self.e, self.l, rmax)
+        if _max is None:
+            return np.empty(0), np.empty(0)
+
+        # compute anomaly points and radii
+        _anomaly = conic_arc_length_anomaly(self.e, self.l, _max, num_segment)
+        r = conic_radius(_anomaly, self.e, self.l)
+
+        if polar:
+            return r, angle_sub(_anomaly, -self.angle0)
+        else:
+            # compute coordinates in apside-centred frame
+            _x, _y = cartesian_from_polar2d(r, _anomaly)
+
+            # rotate from apside-centred frame to reference frame
+            return rotate_2d(_x, _y, -self.angle0)
     
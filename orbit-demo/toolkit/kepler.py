@@ -0,0 +1,123 @@
+"""kepler.py
+
+Kepler timing on conic sections: conversion between true anomaly and mean
+anomaly, and the mean motion for elliptic, parabolic and hyperbolic orbits.
+All functions broadcast over array inputs.
+
+"""
+
+import numpy as np
+
+PI = np.pi
+TWO_PI = 2 * PI
+
+
+def mean_motion(e, l, gm):
+    """Rate of change of the mean anomaly.
+
+    For parabolas (e == 1) the mean anomaly is Barker's D + D**3 / 3.
+    """
+    e, l = np.broadcast_arrays(np.asarray(e, dtype=float), l)
+    _parabolic = 2 * np.sqrt(gm / (l * l * l))
+    _q = np.abs(1 - e * e) / l
+    return np.where(e == 1, _parabolic, np.sqrt(gm * _q * _q * _q))
+
+
+def mean_anomaly_from_true(true_anomaly, e):
+    """Mean anomaly at true anomaly on an orbit of eccentricity e."""
+    true_anomaly, e = np.broadcast_arrays(
+        np.asarray(true_anomaly, dtype=float), np.asarray(e, dtype=float)
+    )
+    # true anomaly in (-pi, pi]
+    _f = PI - (PI - true_anomaly) % TWO_PI
+    _tan = np.tan(0.5 * _f)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        # elliptic: eccentric anomaly
+        _E = 2 * np.arctan(np.sqrt((1 - e) / (1 + e)) * _tan)
+        _elliptic = _E - e * np.sin(_E)
+
+        # hyperbolic: hyperbolic anomaly
+        _H = 2 * np.arctanh(np.sqrt((e - 1) / (e + 1)) * _tan)
+        _hyperbolic = e * np.sinh(_H) - _H
+
+    # parabolic: Barker's equation
+    _parabolic = _tan + _tan * _tan * _tan / 3
+
+    return np.select([e < 1, e > 1], [_elliptic, _hyperbolic], _parabolic)
+
+
+def _solve_elliptic(mean_anomaly, e, tolerance, max_iterations):
+    """Solve E - e sin E = M for the eccentric anomaly."""
+    _M = PI - (PI - mean_anomaly) % TWO_PI
+    _E = np.where(e > 0.8, PI * np.sign(_M), _M)
+    for _ in range(max_iterations):
+        _step = (_E - e * np.sin(_E) - _M) / (1 - e * np.cos(_E))
+        _E = _E - _step
+        if np.all(np.abs(_step) < tolerance):
+            break
+    return _E
+
+
+def _solve_hyperbolic(mean_anomaly, e, tolerance, max_iterations):
+    """Solve e sinh H - H = M for the hyperbolic anomaly."""
+    _H = np.sign(mean_anomaly) * np.log(2 * np.abs(mean_anomaly) / e + 1.8)
+    for _ in range(max_iterations):
+        _step = (e * np.sinh(_H) - _H - mean_anomaly) / (e * np.cosh(_H) - 1)
+        _H = _H - _step
+        if np.all(np.abs(_step) < tolerance * np.maximum(1, np.abs(_H))):
+            break
+    return _H
+
+
+def true_anomaly_from_mean(mean_anomaly, e, tolerance=1e-13, max_iterations=50):
+    """True anomaly at mean anomaly, by vectorised Newton iteration.
+
+    Elliptic true anomalies are returned in [0, 2pi); hyperbolic and
+    parabolic true anomalies in (-pi, pi).
+    """
+    mean_anomaly, e = np.broadcast_arrays(
+        np.asarray(mean_anomaly, dtype=float), np.asarray(e, dtype=float)
+    )
+    true_anomaly = np.empty(mean_anomaly.shape)
+
+    # each branch is solved only on the orbits of that type
+    _elliptic, _hyperbolic = e < 1, e > 1
+    _parabolic = ~(_elliptic | _hyperbolic)
+
+    if np.any(_elliptic):
+        _e = e[_elliptic]
+        _E = _solve_elliptic(
+            mean_anomaly[_elliptic], _e, tolerance, max_iterations
+        )
+        true_anomaly[_elliptic] = 2 * np.arctan2(
+            np.sqrt(1 + _e) * np.sin(0.5 * _E),
+            np.sqrt(1 - _e) * np.cos(0.5 * _E),
+        ) % TWO_PI
+
+    if np.any(_hyperbolic):
+        _e = e[_hyperbolic]
+        _H = _solve_hyperbolic(
+            mean_anomaly[_hyperbolic], _e, tolerance, max_iterations
+        )
+        true_anomaly[_hyperbolic] = 2 * np.arctan(
+            np.sqrt((_e + 1) / (_e - 1)) * np.tanh(0.5 * _H)
+        )
+
+    if np.any(_parabolic):
+        # closed-form solution of D + D**3 / 3 = M, D = c - 1/c with
+        # c**3 = w + sqrt(1 + w**2); solved for |M| and written as
+        # 2w / (c**2 + 1 + 1/c**2) to avoid cancellation, as D is odd in M
+        _M = mean_anomaly[_parabolic]
+        _w = 1.5 * np.abs(_M)
+        _cbrt = np.cbrt(_w + np.hypot(1, _w))
+        _D = 2 * _w / (_cbrt * _cbrt + 1 + 1 / (_cbrt * _cbrt))
+        true_anomaly[_parabolic] = 2 * np.arctan(np.copysign(_D, _M))
+
+    return true_anomaly
+
+
+def propagate_true_anomaly(true_anomaly, e, l, gm, dt):
+    """True anomaly a time dt after true_anomaly on a conic section."""
+    _M = mean_anomaly_from_true(true_anomaly, e) + mean_motion(e, l, gm) * dt
+    return true_anomaly_from_mean(_M, e)
@@ -1,5 +1,8 @@
 """visualisation.py."""
 
+# standard library imports
+from time import perf_counter
+
 # third party imports
 import matplotlib.pyplot as plt
 import matplotlib.patches as mpatches
@@ -7,12 +10,14 @@ from matplotlib.widgets import Slider, Button
 from numpy import deg2rad
 
 # local imports
-from orbits import OrbitalState
-from orbits import conic_from_state
+from orbits import OrbitalState, OrbitalElements
+from orbits import conic_from_state, propagate_elements
 from impulses import add_impulse_vector, calculate_impulse
-from toolkit.conics import conic_semimajor_axis
+from toolkit.conics import get_conic_scale
 from toolkit.vector import Vector2D
-from .artists import ConicArtist, OrbitalStateArtist, ImpulseArtist
+from .artists import ConicArtist, ConicPathArtist
+from .artists import OrbitalStateArtist, ImpulseArtist
+from .artists import OrbitMarkerArtist
 
 # axes positions
 MAIN_AXES = [0.05, 0.15, 0.5, 0.7]
@@ -21,6 +26,8 @@ ANGLE_SLIDER = [0.80, 0.3, 0.15, 0.03]
 IMPULSE_SPEED_SLIDER = [0.60, 0.15, 0.15, 0.03]
 IMPULSE_ANGLE_SLIDER = [0.80, 0.15, 0.15, 0.03]
 RESET_BUTTON = [0.85, 0.1, 0.1, 0.04]
+WARP_SLIDER = [0.60, 0.45, 0.15, 0.03]
+PLAY_BUTTON = [0.85, 0.445, 0.1, 0.04]
 #MAIN_AXES = [0.125, 0.25, 0.775, 0.63]
 #SPEED_SLIDER = [0.10, 0.150, 0.3, 0.03]
 #ANGLE_SLIDER = [0.10, 0.075, 0.3, 0.03]
@@ -31,13 +38,22 @@ RESET_BUTTON = [0.85, 0.1, 0.1, 0.04]
 # label positions
 VELOCITY_LABEL = [0.60, 0.375]
 IMPULSE_LABEL = [0.60, 0.225]
+PLAYBACK_LABEL = [0.60, 0.525]
+
+# playback
+PLAYBACK_FPS = 60
+NUM_MARKERS = 12
+
+# conic resolution, reduced while a slider is being dragged
+FULL_SEGMENTS = 3000
+DRAFT_SEGMENTS = 300
+
+# conic rendering: dense polar polyline or Cartesian Bezier path
+CONIC_ARTISTS = {
+    'locus' : ConicArtist,
+    'path' : ConicPathArtist,
+}
 
-def get_conic_scale(conic):
-    """Determine characteristic length scale for conic."""
-    e, l = conic.e, conic.l
-    a = conic_semimajor_axis(e, l)
-    return 2 * (a if e < 1 else abs(a) * e)
-     
 def set_xylims(ax, lim, ratio=1):
     """Set square axes limits for ax."""
     ax.set_xlim(-lim, lim)
@@ -67,47 +83,85 @@ def format_slider(slider):
 
 
 class OrbitImpulseUI:
-    def __init__(self, fig, initial_speed, initial_angle, speed_scale):
+    def __init__(self, fig, initial_speed, initial_angle, speed_scale,
+                 render_mode='path', gm=1):
         """Initialiser."""
         self.figure = fig
+        self.gm = gm
+        self.speed_scale = speed_scale
+        self.render_mode = render_mode
+        _conic_artist = CONIC_ARTISTS[render_mode]
+
+        # draft resolution while dragging, for renderers that benefit
+        self._draftable = _conic_artist.resolution_dependent
+
+        # sliders give speeds relative to the circular speed at radius 1
+        self.circular_speed = gm ** 0.5
+        _arrow_scale = speed_scale / self.circular_speed
         
         # calculate initial state
         _initial_state = OrbitalState.from_state_components(
-            1, 0, initial_speed, initial_angle
+            1, 0, initial_speed * self.circular_speed, initial_angle
+        )
+        _initial_conic = conic_from_state(_initial_state, gm=self.gm)
+        _initial_elements = OrbitalElements.from_state(
+            _initial_state, gm=self.gm
         )
-        _initial_conic = conic_from_state(_initial_state, gm=1)
+        _scale = 1.3 * get_conic_scale(_initial_conic)
         
         # add main display axes
         self.ax = fig.add_axes(MAIN_AXES, projection='polar')
         self.ax.grid(True)
 
         # initialise artists
-        _old_orbit = ConicArtist(self.ax, _initial_conic, c='C0', zorder=2)
+        _old_orbit = _conic_artist(
+            self.ax, _initial_conic, _scale, FULL_SEGMENTS, c='C0', zorder=2
+        )
         
         _old_orbit_state = OrbitalStateArtist(
-            self.ax, _initial_state, speed_scale,                              
+            self.ax, _initial_state, _arrow_scale,                              
             arrowprops={'mutation_scale':15, 'zorder':4, 'facecolor':'C0'}
         )
 
-        _new_orbit = ConicArtist(self.ax, _initial_conic, c='C2', zorder=1)
+        _new_orbit = _conic_artist(
+            self.ax, _initial_conic, _scale, FULL_SEGMENTS, c='C2', zorder=1
+        )
         
         _new_orbit_state = OrbitalStateArtist(
-            self.ax, _initial_state, speed_scale,                              
+            self.ax, _initial_state, _arrow_scale,                              
             arrowprops={'mutation_scale':15, 'zorder':3, 'facecolor':'C2'}
         )
 
         _impulse = ImpulseArtist(
-            self.ax, _initial_state, Vector2D(0, 0), speed_scale, 
+            self.ax, _initial_state, Vector2D(0, 0), _arrow_scale,
             arrowprops={'mutation_scale':15, 'zorder':5, 'facecolor':'C1'}
         )
         
+        _old_orbit_markers = OrbitMarkerArtist(
+            self.ax, _initial_elements, gm, NUM_MARKERS,
+            c='C0', ms=4, zorder=6,
+        )
+
+        _new_orbit_markers = OrbitMarkerArtist(
+            self.ax, _initial_elements, gm, NUM_MARKERS,
+            c='C2', ms=4, zorder=6,
+        )
+
         self.artists = {
             'old_orbit' : _old_orbit,
             'old_orbit_state' : _old_orbit_state,
+            'old_orbit_markers' : _old_orbit_markers,
             'new_orbit' : _new_orbit,
             'new_orbit_state' : _new_orbit_state,
+            'new_orbit_markers' : _new_orbit_markers,
             'impulse' : _impulse,
         }
+
+        # orbital elements at the epoch of the impulse
+        self.elements = {
+            'old_orbit' : _initial_elements,
+            'new_orbit' : _initial_elements,
+        }
         
         # static artists:
         _static_artists = [
@@ -130,6 +184,11 @@ class OrbitImpulseUI:
             ha='left', va='bottom',
             fontweight='bold',
         )
+        self.figure.text(
+            *PLAYBACK_LABEL, 'Playback',
+            ha='left', va='bottom',
+            fontweight='bold',
+        )
 
         
         # add slider to control the speed
@@ -187,6 +246,24 @@ class OrbitImpulseUI:
             hovercolor='0.975',
         )
         
+        # add slider to control playback speed and a play/pause button
+        _warp_slider = Slider(
+            ax=self.figure.add_axes(WARP_SLIDER),
+            label='Time warp',
+            valmin=0.1,
+            valmax=10.,
+            valinit=1.,
+            valstep=0.1,
+            valfmt='%.1f\u00D7',
+            facecolor='C3',
+        )
+
+        _play_button = Button(
+            ax=self.figure.add_axes(PLAY_BUTTON),
+            label='Play',
+            hovercolor='0.975',
+        )
+
         self.sliders = {
             'speed_slider' : _speed_slider,
             'angle_slider' : _angle_slider,
@@ -197,59 +274,198 @@ class OrbitImpulseUI:
         self.widgets = {
             **self.sliders, 
             'reset_button' : _reset_button,
+            'warp_slider' : _warp_slider,
+            'play_button' : _play_button,
         }
 
         for _, slider in self.sliders.items():
             format_slider(slider)
+        format_slider(_warp_slider)
 
         # register callbacks
         for _, slider in self.sliders.items():
             slider.on_changed(self.update)
 
         self.widgets['reset_button'].on_clicked(self.reset)
+        self.widgets['warp_slider'].on_changed(self.set_time_warp)
+        self.widgets['play_button'].on_clicked(self.toggle_playback)
+
+        # playback state: simulation time is tied to the wall clock, so
+        # slow frames are dropped rather than slowing the simulation
+        self.playing = False
+        self.playback_time = 0.
+        self._clock = (perf_counter(), 0.)
+        self._background = None
+        self.timer = self.figure.canvas.new_timer(
+            interval=1000 / PLAYBACK_FPS
+        )
+        self.timer.add_callback(self.advance)
+        self.figure.canvas.mpl_connect('draw_event', self._on_draw)
+
+        # redraw at full resolution when a slider drag ends
+        self._draft = False
+        self.figure.canvas.mpl_connect(
+            'button_release_event', self._on_release
+        )
 
         # set axis scale - this has to happen after drawing?
-        _scale = 1.3 * get_conic_scale(_initial_conic)
         self.ax.set_rmax(_scale)
 
 
+    @property
+    def moving_artists(self):
+        """Artists redrawn on every playback frame."""
+        return [
+            self.artists['old_orbit_state'].arrow,
+            self.artists['new_orbit_state'].arrow,
+            self.artists['old_orbit_markers'].markers,
+            self.artists['new_orbit_markers'].markers,
+        ]
+
+    def toggle_playback(self, event):
+        if self.playing:
+            self.stop_playback()
+        else:
+            self.start_playback()
+
+    def start_playback(self):
+        self.playing = True
+        self.widgets['play_button'].label.set_text('Pause')
+        self._restart_clock(self.playback_time)
+
+        # moving artists are drawn by blitting, not by the canvas
+        if self.figure.canvas.supports_blit:
+            for _artist in self.moving_artists:
+                _artist.set_animated(True)
+        self.timer.start()
+        self.figure.canvas.draw_idle()
+
+    def stop_playback(self):
+        self.playing = False
+        self.widgets['play_button'].label.set_text('Play')
+        self.timer.stop()
+        for _artist in self.moving_artists:
+            _artist.set_animated(False)
+        self._background = None
+        self.figure.canvas.draw_idle()
+
+    def set_time_warp(self, val):
+        # keep the current simulation time when the rate changes
+        self._restart_clock(self.playback_time)
+
+    def _restart_clock(self, time):
+        self._clock = (perf_counter(), time)
+
+    def _on_draw(self, event):
+        """Capture the static background after a full redraw."""
+        _canvas = self.figure.canvas
+        if not (self.playing and _canvas.supports_blit):
+            return
+        self._background = _canvas.copy_from_bbox(self.ax.bbox)
+        self._draw_moving_artists()
+
+    def _draw_moving_artists(self):
+        for _artist in self.moving_artists:
+            self.ax.draw_artist(_artist)
+
+    def set_playback_time(self, time):
+        """Move states and markers to time after the impulse."""
+        self.playback_time = time
+        for _orbit in ('old_orbit', 'new_orbit'):
+            _elements = propagate_elements(self.elements[_orbit], self.gm, time)
+            _state = OrbitalState.from_elements(_elements, gm=self.gm)
+            self.artists[f'{_orbit}_state'].update(_state)
+            self.artists[f'{_orbit}_markers'].set_time(time)
+
+    def advance(self, time=None):
+        """Timer callback: advance playback to the current wall-clock time.
+
+        A replayed session passes the recorded playback time instead.
+        """
+        if time is None:
+            _wall0, _time0 = self._clock
+            _warp = self.widgets['warp_slider'].val
+            time = _time0 + _warp * (perf_counter() - _wall0)
+        self.set_playback_time(time)
+
+        _canvas = self.figure.canvas
+        if self._background is None:
+            _canvas.draw_idle()
+            return
+        _canvas.restore_region(self._background)
+        self._draw_moving_artists()
+        _canvas.blit(self.ax.bbox)
+
+    @property
+    def dragging(self):
+        """Whether any slider is being dragged."""
+        return any(slider.drag_active for slider in self.sliders.values())
+
+    def _on_release(self, event):
+        if self._draft and not self.dragging:
+            self.update(None)
+
     def reset(self, event):
+        # reset sliders silently, then update once rather than per slider
         for _, slider in self.sliders.items():
+            slider.eventson = False
             slider.reset()
+            slider.eventson = True
+        self.update(None)
         
     def update(self, val):
         # new values
-        _speed = self.widgets['speed_slider'].val
+        _speed = self.widgets['speed_slider'].val * self.circular_speed
         _angle = self.widgets['angle_slider'].val
         _angle = deg2rad(_angle)
         
         _impulse_speed = self.widgets['impulse_speed_slider'].val
+        _impulse_speed = _impulse_speed * self.circular_speed
         _impulse_angle = self.widgets['impulse_angle_slider'].val
         _impulse_angle = deg2rad(_impulse_angle)
         
         # calculate updated old orbit
         _old_state = OrbitalState.from_state_components(1, 0, _speed, _angle)
-        _old_conic = conic_from_state(_old_state, gm=1)
+        _old_conic = conic_from_state(_old_state, gm=self.gm)
 
         # calculate updated new orbit
         _impulse = calculate_impulse(_old_state, _impulse_speed, _impulse_angle)
         _new_state = add_impulse_vector(_old_state, _impulse)
-        _new_conic = conic_from_state(_new_state, gm=1)
+        _new_conic = conic_from_state(_new_state, gm=self.gm)
+
+        # orbital elements at the epoch of the impulse
+        self.elements['old_orbit'] = OrbitalElements.from_state(
+            _old_state, gm=self.gm
+        )
+        self.elements['new_orbit'] = OrbitalElements.from_state(
+            _new_state, gm=self.gm
+        )
         
-        # update orbit artists
-        self.artists['old_orbit'].update(_old_conic)
-        self.artists['new_orbit'].update(_new_conic)
+        # visible radius
+        _scale = 1.3 * max(get_conic_scale(c) for c in (_old_conic, _new_conic))
+
+        # update orbit artists, clipped to the view and at reduced
+        # resolution while a slider is being dragged
+        self._draft = self.dragging and self._draftable
+        _segments = DRAFT_SEGMENTS if self._draft else FULL_SEGMENTS
+        self.artists['old_orbit'].update(_old_conic, _scale, _segments)
+        self.artists['new_orbit'].update(_new_conic, _scale, _segments)
         
         # update orbit state artists
         self.artists['old_orbit_state'].update(_old_state)
         self.artists['new_orbit_state'].update(_new_state)
+
+        # restart playback from the impulse
+        self.artists['old_orbit_markers'].update(self.elements['old_orbit'])
+        self.artists['new_orbit_markers'].update(self.elements['new_orbit'])
+        self.playback_time = 0.
+        self._restart_clock(0.)
         
         # update impulse artist 
         #TODO: clean up? reduce duplication of end point calculation?
         self.artists['impulse'].update(_old_state, _impulse)
         
         # update axis scale
-        _scale = 1.3 * max(get_conic_scale(c) for c in (_old_conic, _new_conic))
 #        set_xylims(self.ax, 1.1 * _scale, ratio=0.5)
         self.ax.set_rmax(_scale)
         
@@ -4,7 +4,8 @@
 """
 
 
-from ._conic_artists import ConicArtist
+from ._conic_artists import ConicArtist, ConicPathArtist
+from ._conic_artists import OrbitMarkerArtist
 from ._vector_artists import VectorArrowArtist
 from ._vector_artists import OrbitalStateArtist, ImpulseArtist
 
@@ -4,11 +4,30 @@
 
 # third party imports
 import numpy as np
+import matplotlib as mpl
 import matplotlib.patches as mpatches
+from matplotlib.path import Path
 
 # local imports
 from toolkit.vector import Vector2D
 from toolkit import rotate_2d
+from toolkit.conics import conic_radius, conic_max_anomaly
+from toolkit.kepler import mean_motion, propagate_true_anomaly
+
+PI = np.pi
+TWO_PI = 2 * PI
+
+# largest relative radial error of a Bezier path; near-parabolic conics
+# need finer segments than the defaults below to meet it
+BEZIER_TOLERANCE = 1e-4
+
+# Bezier segments per ellipse, and largest hyperbolic anomaly per segment
+ELLIPSE_SEGMENTS = 8
+HYPERBOLA_STEP = 0.35
+
+# default locus resolution; unclipped hyperbolic paths end at the
+# outermost point of ConicSection.locus() at this resolution
+LOCUS_SEGMENTS = 3000
 
 
 def conic_line_of_apsides(conic):
@@ -23,19 +42,202 @@ def conic_line_of_apsides(conic):
     _y = np.asarray([0, 0])
     return rotate_2d(_x, _y, -conic.angle0)
     
-def conic_polar_locus(conic):
-    r, theta = conic.locus(polar=True)
+def conic_polar_locus(conic, rmax=None, num_segment=LOCUS_SEGMENTS):
+    """Polar locus, clipped to radius rmax when it is given."""
+    if rmax is None:
+        r, theta = conic.locus(num_segment, polar=True)
+    else:
+        r, theta = conic.view_locus(rmax, num_segment, polar=True)
     return theta, r
 
 
 
+def _bezier_path(points, tangents, scale, angle0):
+    """Cubic Bezier path through points with end tangents per segment.
+
+    The segment between points k and k+1 uses control points offset along
+    the tangents by scale[k].
+    """
+    _x, _y = points
+    _dx, _dy = tangents
+    _num = len(_x) - 1
+
+    # control points: P0, P0 + s T0, P1 - s T1, P1 for each segment
+    _vx = np.empty(3 * _num + 1)
+    _vy = np.empty(3 * _num + 1)
+    _vx[::3], _vy[::3] = _x, _y
+    _vx[1::3] = _x[:-1] + scale * _dx[:-1]
+    _vy[1::3] = _y[:-1] + scale * _dy[:-1]
+    _vx[2::3] = _x[1:] - scale * _dx[1:]
+    _vy[2::3] = _y[1:] - scale * _dy[1:]
+
+    # rotate from apside-centred frame to reference frame
+    _vertices = np.column_stack(rotate_2d(_vx, _vy, -angle0))
+    _codes = np.full(len(_vertices), Path.CURVE4, dtype=Path.code_type)
+    _codes[0] = Path.MOVETO
+    return Path(_vertices, _codes)
+
+def conic_bezier_path(conic, rmax=None, num_segment=LOCUS_SEGMENTS):
+    """Principal branch of a conic as a Cartesian Bezier path.
+
+    Ellipses are affine images of a circle in eccentric anomaly, so the
+    standard cubic circle-arc approximation applies unchanged; hyperbolas
+    use cubic Hermite segments in hyperbolic anomaly, and parabolas are
+    exact. The branch is clipped to radius rmax if given; otherwise
+    hyperbolic branches end at the same radius as conic.locus().
+    """
+    e, l = conic.e, conic.l
+
+    # extent of the branch in true anomaly
+    if rmax is None:
+        _fmax = PI if e < 1 else np.arccos(-1. / e) * (1 - 2. / num_segment)
+    else:
+        _fmax = conic_max_anomaly(e, l, rmax)
+        if _fmax is None:
+            return Path(np.empty((0, 2)))
+    _tan = np.tan(0.5 * _fmax)
+
+    if e < 1:
+        # x = a (cos E - e), y = b sin E
+        _a = l / (1 - e * e)
+        _b = _a * np.sqrt(1 - e * e)
+        _closed = _fmax >= PI
+        _Emax = PI if _closed else 2 * np.arctan(
+            np.sqrt((1 - e) / (1 + e)) * _tan
+        )
+
+        # a circle arc of angle dE strays by dE**6 / 55296 of a, which is
+        # r / (1 - e) at worst
+        _step = min(
+            TWO_PI / ELLIPSE_SEGMENTS,
+            (55296 * BEZIER_TOLERANCE * (1 - e)) ** (1. / 6),
+        )
+        _num = max(int(np.ceil(2 * _Emax / _step)), 1)
+        _E = np.linspace(-_Emax, _Emax, _num + 1)
+        _c, _s = np.cos(_E), np.sin(_E)
+        _kappa = 4. / 3 * np.tan(0.25 * (_E[1] - _E[0]))
+
+        # a (cos E - e) without cancellation near periapsis
+        _x = l / (1 + e) - 2 * _a * np.sin(0.5 * _E) ** 2
+        _path = _bezier_path(
+            (_x, _b * _s), (-_a * _s, _b * _c), _kappa, conic.angle0,
+        )
+        if not _closed:
+            return _path
+        return Path(
+            np.vstack([_path.vertices, _path.vertices[:1]]),
+            np.append(_path.codes, Path.CLOSEPOLY),
+        )
+
+    if e == 1:
+        # x = l (1 - D**2) / 2, y = l D with D = tan(f / 2): exact cubic
+        _D = np.array([-_tan, _tan])
+        return _bezier_path(
+            (0.5 * l * (1 - _D * _D), l * _D), (-l * _D, l * np.ones(2)),
+            _tan / 1.5, conic.angle0,
+        )
+
+    # x = a (e - cosh H), y = b sinh H
+    _a = l / (e * e - 1)
+    _b = _a * np.sqrt(e * e - 1)
+    _Hmax = 2 * np.arctanh(np.sqrt((e - 1) / (e + 1)) * _tan)
+
+    # a Hermite segment of width dH strays by dH**4 / 384 of
+    # (a cosh H, b sinh H), which is e r / (e - 1) at worst
+    _step = min(
+        HYPERBOLA_STEP, (384 * BEZIER_TOLERANCE * (e - 1) / e) ** 0.25
+    )
+    _num = max(int(np.ceil(2 * _Hmax / _step)), 1)
+    _H = np.linspace(-_Hmax, _Hmax, _num + 1)
+    _ch, _sh = np.cosh(_H), np.sinh(_H)
+
+    # a (e - cosh H) without cancellation near periapsis
+    _x = l / (1 + e) - 2 * _a * np.sinh(0.5 * _H) ** 2
+    return _bezier_path(
+        (_x, _b * _sh), (-_a * _sh, _b * _ch), (_H[1] - _H[0]) / 3,
+        conic.angle0,
+    )
+
+
 class ConicArtist:
-    """A line representing a conic section."""
-    def __init__(self, ax, conic, **kwargs):
+    """A line representing a conic section.
+
+    If rmax is given, the line covers only the part of the conic within
+    that radius, with num_segment segments evenly spaced in arc length.
+    """
+    # cost scales with num_segment, so a draft resolution is worthwhile
+    resolution_dependent = True
+
+    def __init__(self, ax, conic, rmax=None, num_segment=LOCUS_SEGMENTS,
+                 **kwargs):
         """Initialiser."""
-        self.locus, = ax.plot(*conic_polar_locus(conic), **kwargs)
-        
-    def update(self, new_conic):
-        self.locus.set_data(*conic_polar_locus(new_conic))
-        return self.locus, 
+        self.locus, = ax.plot(
+            *conic_polar_locus(conic, rmax, num_segment), **kwargs
+        )
         
+    def update(self, new_conic, rmax=None, num_segment=LOCUS_SEGMENTS):
+        self.locus.set_data(*conic_polar_locus(new_conic, rmax, num_segment))
+        return self.locus,
+
+
+class ConicPathArtist:
+    """A Bezier path patch representing a conic section.
+
+    Drop-in alternative to ConicArtist: the path is built in Cartesian
+    coordinates and drawn through the polar axes' Cartesian transform, so
+    a few dozen vertices replace the dense polyline. The path has a fixed
+    number of segments when clipped, so num_segment only sets where
+    unclipped hyperbolas end.
+    """
+    resolution_dependent = False
+
+    def __init__(self, ax, conic, rmax=None, num_segment=LOCUS_SEGMENTS,
+                 **kwargs):
+        """Initialiser."""
+        # accept Line2D-style colour and default to line styling
+        if 'c' in kwargs:
+            kwargs['edgecolor'] = kwargs.pop('c')
+        kwargs.setdefault('linewidth', mpl.rcParams['lines.linewidth'])
+        kwargs.setdefault('fill', False)
+
+        self.locus = mpatches.PathPatch(
+            conic_bezier_path(conic, rmax, num_segment),
+            transform=ax.transData._b, **kwargs
+        )
+        ax.add_patch(self.locus)
+
+    def update(self, new_conic, rmax=None, num_segment=LOCUS_SEGMENTS):
+        self.locus.set_path(conic_bezier_path(new_conic, rmax, num_segment))
+        return self.locus,
+
+
+class OrbitMarkerArtist:
+    """Markers at equally spaced times along an orbit, moved by Kepler timing.
+
+    The first marker is the object at time t; the others trail it at equal
+    intervals spanning one revolution of mean anomaly.
+    """
+    def __init__(self, ax, elements, gm, num_markers=1, **kwargs):
+        """Initialiser."""
+        self.gm = gm
+        self.num_markers = num_markers
+        self.markers, = ax.plot([], [], ls='none', marker='o', **kwargs)
+        self.update(elements)
+
+    def update(self, new_elements, t=0):
+        self.elements = new_elements
+        _n = mean_motion(new_elements.eccentricity,
+                         new_elements.semilatus_rectum, self.gm)
+        self.spacing = TWO_PI / (_n * self.num_markers)
+        return self.set_time(t)
+
+    def set_time(self, t):
+        _el = self.elements
+        _dt = t - self.spacing * np.arange(self.num_markers)
+        _anomaly = propagate_true_anomaly(
+            _el.true_anomaly, _el.eccentricity, _el.semilatus_rectum,
+            self.gm, _dt,
+        )
+        _r = conic_radius(_anomaly, _el.eccentricity, _el.semilatus_rectum)
+        self.markers.set_data(_anomaly + _el.periapsis_angle, _r)
+        return self.markers,
@@ -0,0 +1,236 @@
+"""session.py
+
+Record the slider, button and playback events of an OrbitImpulseUI session
+to a file, and replay them headlessly on an Agg canvas to measure per-event
+latency.
+
+Sessions are stored as JSON lines: a header describing the UI, followed by
+one timestamped event per line.
+
+"""
+
+# standard library imports
+import json
+import time
+from time import perf_counter
+
+# third party imports
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.backend_bases import MouseEvent
+
+# local imports
+from . import OrbitImpulseUI
+
+PERCENTILES = (50, 90, 99)
+
+
+class SessionRecorder:
+    """Records timestamped UI events to a JSON lines file."""
+    def __init__(self, ui, path):
+        """Initialiser."""
+        self.ui = ui
+        self.file = open(path, 'w')
+        self._start = perf_counter()
+
+        # header: enough to rebuild the same UI
+        _figure = ui.figure
+        self._write({
+            'type' : 'session',
+            'initial_speed' : ui.sliders['speed_slider'].valinit,
+            'initial_angle' : ui.sliders['angle_slider'].valinit,
+            'speed_scale' : ui.speed_scale,
+            'render_mode' : ui.render_mode,
+            'gm' : ui.gm,
+            'figsize' : list(_figure.get_size_inches()),
+            'dpi' : _figure.dpi,
+        })
+
+        # register callbacks; the UI's own timer callback runs first, so
+        # frames record the playback time it has just set
+        for name in (*ui.sliders, 'warp_slider'):
+            ui.widgets[name].on_changed(self._slider_callback(name))
+        ui.widgets['reset_button'].on_clicked(self.record_reset)
+        ui.widgets['play_button'].on_clicked(self.record_play)
+        ui.timer.add_callback(self.record_frame)
+        _figure.canvas.mpl_connect('button_release_event', self.record_release)
+
+    def _write(self, record):
+        self.file.write(json.dumps(record) + '\n')
+        self.file.flush()
+
+    def _record(self, event_type, **fields):
+        self._write({
+            'time' : perf_counter() - self._start,
+            'type' : event_type,
+            **fields,
+        })
+
+    def _slider_callback(self, name):
+        def _callback(val):
+            self._record(
+                'slider', name=name, value=float(val),
+                dragging=bool(self.ui.widgets[name].drag_active),
+            )
+        return _callback
+
+    def record_reset(self, event):
+        self._record('reset')
+
+    def record_release(self, event):
+        self._record('release')
+
+    def record_play(self, event):
+        self._record('play')
+
+    def record_frame(self):
+        self._record('frame', playback_time=self.ui.playback_time)
+
+    def close(self):
+        self.file.close()
+
+
+def read_session(path):
+    """Read a recorded session: (header, list of events)."""
+    with open(path) as _file:
+        _records = [json.loads(line) for line in _file if line.strip()]
+    return _records[0], _records[1:]
+
+
+class ReplayCanvas(FigureCanvasAgg):
+    """Agg canvas that defers draw_idle, as a GUI event loop would."""
+    def __init__(self, figure=None):
+        """Initialiser."""
+        super().__init__(figure)
+        self.pending_draw = False
+
+    def draw_idle(self, *args, **kwargs):
+        self.pending_draw = True
+
+
+class ReplayReport:
+    """Per-event compute and draw latencies from a replayed session."""
+    def __init__(self, render_mode, event_types, compute, draw):
+        """Initialiser."""
+        self.render_mode = render_mode
+        self.event_types = np.asarray(event_types)
+        self.compute = np.asarray(compute)
+        self.draw = np.asarray(draw)
+
+    def __repr__(self):
+        return f"ReplayReport({self.render_mode!r}, {len(self)} events)"
+
+    def __len__(self):
+        return len(self.event_types)
+
+    def percentiles(self, percentiles=PERCENTILES):
+        """Latency percentiles in milliseconds for compute, draw and total."""
+        _latencies = {
+            'compute' : self.compute,
+            'draw' : self.draw,
+            'total' : self.compute + self.draw,
+        }
+        return {
+            _name: dict(zip(
+                percentiles, 1e3 * np.percentile(_values, percentiles)
+            ))
+            for _name, _values in _latencies.items()
+        }
+
+    def summary(self):
+        """Table of latency percentiles."""
+        _percentiles = self.percentiles()
+        _columns = list(_percentiles['total'])
+        _lines = [
+            f"render mode: {self.render_mode}, events: {len(self)}",
+            f"{'ms':>8}" + ''.join(f"{f'p{_p}':>10}" for _p in _columns),
+        ]
+        for _name, _values in _percentiles.items():
+            _row = ''.join(f"{_v:>10.2f}" for _v in _values.values())
+            _lines.append(f"{_name:>8}" + _row)
+        return '\n'.join(_lines)
+
+
+def replay_events(ui, events, realtime=False):
+    """Feed recorded events into ui and time each one.
+
+    The UI must be drawn on a ReplayCanvas. Sliders are set silently and
+    their UI callback is called directly, and playback frames are advanced
+    to their recorded playback time; this is timed as compute, and the
+    deferred redraw as draw. With realtime, events are fed at their
+    recorded times. Returns lists of event types, compute and draw times.
+    """
+    _canvas = ui.figure.canvas
+    _slider_callbacks = {
+        **{_name: ui.update for _name in ui.sliders},
+        'warp_slider' : ui.set_time_warp,
+    }
+
+    _types, _compute, _draw = [], [], []
+    _start = perf_counter()
+    for _event in events:
+        if realtime:
+            time.sleep(max(_event['time'] - (perf_counter() - _start), 0))
+
+        # feed the event into the UI
+        _t0 = perf_counter()
+        if _event['type'] == 'slider':
+            _slider = ui.widgets[_event['name']]
+            _slider.drag_active = _event['dragging']
+            _slider.eventson = False
+            _slider.set_val(_event['value'])
+            _slider.eventson = True
+            _slider_callbacks[_event['name']](_event['value'])
+            _slider.drag_active = False
+        elif _event['type'] == 'reset':
+            ui.reset(None)
+        elif _event['type'] == 'play':
+            ui.toggle_playback(None)
+        elif _event['type'] == 'frame':
+            ui.advance(_event['playback_time'])
+        elif _event['type'] == 'release':
+            _canvas.callbacks.process(
+                'button_release_event',
+                MouseEvent('button_release_event', _canvas, 0, 0, 1),
+            )
+        _t1 = perf_counter()
+
+        # redraw, if the event requested one
+        if _canvas.pending_draw:
+            _canvas.pending_draw = False
+            _canvas.draw()
+        _t2 = perf_counter()
+
+        _types.append(_event['type'])
+        _compute.append(_t1 - _t0)
+        _draw.append(_t2 - _t1)
+
+    return _types, _compute, _draw
+
+
+def replay_session(path, render_mode=None, realtime=False,
+                   style='fivethirtyeight'):
+    """Replay a recorded session headlessly and time every event.
+
+    Events are fed into a UI rebuilt from the session header by
+    replay_events. The recorded render mode may be overridden to compare
+    modes on the same input.
+    """
+    header, events = read_session(path)
+    render_mode = render_mode or header['render_mode']
+
+    with plt.style.context(style):
+        _figure = Figure(header['figsize'], dpi=header['dpi'])
+        _canvas = ReplayCanvas(_figure)
+        ui = OrbitImpulseUI(
+            _figure,
+            header['initial_speed'], header['initial_angle'],
+            header['speed_scale'], render_mode=render_mode,
+            gm=header.get('gm', 1),
+        )
+        _canvas.draw()
+        _types, _compute, _draw = replay_events(ui, events, realtime)
+
+    return ReplayReport(render_mode, _types, _compute, _draw)